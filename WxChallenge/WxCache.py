@@ -0,0 +1,106 @@
+import logging
+import os, gzip, hashlib, json, time, tempfile
+
+_cache_dir = os.path.join( os.path.expanduser('~'), '.WxChallenge', 'cache' )
+
+class WxCache( object ):
+  """
+  On-disk, compressed cache of pages downloaded from the WxChallenge server
+
+  Pages are keyed on the URL and the parameters posted to the server, and
+  are stored gzip compressed under the cache directory. Pages for forecast
+  periods that are finished never expire; all other pages expire after
+  the time-to-live.
+  """
+
+  def __init__(self, path = None, ttl = 3600.0):
+    """
+    Arguments:
+      None.
+
+    Keyword arguments:
+      path (str)  : Directory to store cached pages in
+      ttl (float) : Time-to-live, in seconds, of pages that may still change
+
+    """
+
+    self.__log = logging.getLogger( __name__ )
+    self.path  = _cache_dir if path is None else path
+    self.ttl   = ttl
+    os.makedirs( self.path, exist_ok = True )
+
+  def key(self, url, params = None):
+    """Generate unique key for URL and request parameters"""
+
+    params = json.dumps( params or {}, sort_keys = True, default = str )        # Parameters as string with sorted keys so order does not matter
+    return hashlib.sha1( '{}?{}'.format(url, params).encode() ).hexdigest()
+
+  def file(self, url, params = None):
+    """Path to the cache file for URL and request parameters"""
+
+    key = self.key( url, params )
+    return os.path.join( self.path, key[:2], '{}.html.gz'.format(key) )
+
+  def get(self, url, params = None, final = False):
+    """
+    Get page from the cache
+
+    Arguments:
+      url (str) : URL of the page
+
+    Keyword arguments:
+      params (dict) : Parameters posted to the server
+      final (bool)  : If set, page can no longer change so it never expires
+
+    Returns:
+      bytes : Content of the page; None if not cached or expired
+
+    """
+
+    path = self.file( url, params )
+    try:
+      age = time.time() - os.path.getmtime( path )
+    except OSError:
+      return None
+
+    if not final and (self.ttl is not None) and (age > self.ttl):               # If the page can change and is older than ttl
+      self.__log.debug( f'Cached page expired : {url}; {params}' )
+      return None
+
+    try:
+      with gzip.open( path, 'rb' ) as fid:
+        return fid.read()
+    except Exception as err:
+      self.__log.warning( f'Failed to read cached page {path} : {err}' )
+    return None
+
+  def put(self, url, params, content):
+    """
+    Add page to the cache
+
+    File is written to a temporary file and then moved into place so that
+    concurrent readers never see a partial file.
+
+    Arguments:
+      url (str)       : URL of the page
+      params (dict)   : Parameters posted to the server
+      content (bytes) : Content of the page
+
+    Keyword arguments:
+      None.
+
+    Returns:
+      None.
+
+    """
+
+    path = self.file( url, params )
+    os.makedirs( os.path.dirname(path), exist_ok = True )
+    fd, tmp = tempfile.mkstemp( dir = os.path.dirname(path) )
+    try:
+      with os.fdopen( fd, 'wb' ) as fid:
+        fid.write( gzip.compress( content ) )
+      os.replace( tmp, path )
+    except Exception as err:
+      self.__log.warning( f'Failed to cache page {path} : {err}' )
+      if os.path.isfile( tmp ): os.remove( tmp )
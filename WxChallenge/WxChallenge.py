@@ -1,5 +1,6 @@
 import logging
 
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import timedelta;
 
 from .WxSQLite import WxSQLite;
@@ -14,7 +15,8 @@ class WxChallenge( WxSQLite ):
     self._forecasters = None
 
   ###########################################################################
-  def update_Semester(self, semester = None, year = None, schools = None):
+  def update_Semester(self, semester = None, year = None, schools = None, workers = None,
+                      incremental = True, fanout = False):
     """
     Download data from the WxChallenge.com for a given semester in a given year.
 
@@ -27,14 +29,23 @@ class WxChallenge( WxSQLite ):
        year (int) : Year to download
          Default is current year based on today's date
        school (str) : School code; only get data from this school
+       workers (int) : Number of results pages to download and parse
+         concurrently. Default is to get pages one at a time. All
+         database writes are still done from the calling thread.
+       incremental (bool) : Skip pages for forecast cities that are finished
+         and are already stored in the database. Set to False to download
+         everything.
+       fanout (bool) : Download the national results page once per city and
+         day and split out the forecasts for all requested schools, instead
+         of downloading a page for each school.
     
     Returns:
-       bool
+       bool : False if any results page could not be downloaded
 
     """
 
     if semester is None or year is None:
-      year     = self.__schedule.date
+      year     = self._schedule.date.year
       semester = getSemester(self._schedule.date)
 
     tag = '{}:{}'.format(semester, year);                                       # Define tag for indexing _schedule
@@ -45,16 +56,28 @@ class WxChallenge( WxSQLite ):
     identifiers = [id for id in self._schedule[tag]] 
     days        = [i for i in range(1, 9)];                                             # If day is not set, then generate numbers from 1-8, inclusive.
 
+    filt = None                                                                 # Schools to filter results pages by
+    if fanout and schools is not None:                                          # If fanout, get national page and filter by schools
+      filt    = schools if isinstance(schools, (list, tuple)) else [schools]
+      schools = None
+
     args, dates = self.__get_results_args_dates(
       year, semester, identifiers, days, schools = schools
     );
-    for i in range(len(args)):                                                  # Iterate over all urls
-      self.__log.debug( 'Arguments for results: {}'.format(args[i]) )
-      res = self.getResults( *args[i] )                                        # Download the HTML
-      if res:                                                                  # If data download was successful 
-        forecasts = res.results()
-        self.add_forecasts( forecasts )
-        self.add_verification( res )
+    if incremental:
+      args, dates = self.__plan_results_args( semester, year, args, dates, schools = filt )
+    failed = []                                                                 # List of arguments that failed to download
+    with self.transaction():                                                    # Commit all pages at once
+      for arg, res, forecasts in self.__iter_results( args, workers = workers, school = filt ):  # Iterate over results as they are downloaded and parsed
+        if res:                                                                # If data download was successful 
+          self.add_forecasts( forecasts )
+          self.add_verification( res )
+        else:
+          failed.append( arg )
+    if len(failed) > 0:
+      self.__log.error( 'Failed to get results for {} of {} requests: {}'.format(
+        len(failed), len(args), failed) )
+      return False
     return True;
 
   def update_Day(self, semester, year, identifier, day, schools = None):
@@ -166,18 +189,90 @@ class WxChallenge( WxSQLite ):
 
     """
 
-    out_id, out_day = None, None;
-    if semYear in self._schedule:                                               # If the semester and year are NOT in the schedule
-      for identifier in self._schedule[semYear]:                                # Else, iterate over all the identifiers in the semester/year that are in the schedule
-        tmp = self._schedule[semYear][identifier];                              # Get the data for a given identifier in a given semester/year
-        if tmp['start'] <= date and tmp['end'] >= date:                         # If the date input is between the starting/ending dates for the station
-          day = (date - tmp['start']).days + 1;                                 # Compute rough forecast day
-          if day == 5 or day == 6: break;                                       # If day is 5 or 6, then break; no forecasting on Saturday/Sunday
-          if day >= 7: day = (day % 7) + 4;                                     # If the day is greater or equal 7, then mod 7 and add 4
-          if day >= 9: break;                                                   # If the day is greater or equal 9, no forecasting on Saturday/Sunday
-          out_id, out_day = identifier, day;                                    # Determine the forecast day
-          break;                                                                # Break the loop
-    return out_id, out_day;                                                     # Determine the forecast day
+    return self._schedule.lookup( date, semYear = semYear )                     # Binary search of the schedule interval index
+
+  ##############################################################################
+  def _fetchResults(self, args, school = None):
+    """
+    Download and parse a single results page
+
+    Only touches the network and the parser, so is safe to run in a
+    worker thread.
+
+    Arguments:
+      args (tuple) : Arguments for the getResults method
+
+    Keyword arguments:
+      school (str, list) : School code(s) to keep forecasts for
+
+    Returns:
+      tuple : The WxResults object and the parsed forecasts; both are None
+        if the page could not be downloaded or parsed
+
+    """
+
+    self.__log.debug( 'Arguments for results: {}'.format(args) )
+    try:
+      res = self.getResults( *args )                                            # Download the HTML
+      if res:                                                                   # If data download was successful 
+        return res, res.results( school = school, columnar = True )
+    except Exception as err:
+      self.__log.error( 'Failed to parse results for {}: {}'.format(args, err) )
+    return None, None
+
+  def __iter_results(self, args, workers = None, school = None):
+    """
+    Generator yielding (args, WxResults, forecasts) for all results requests
+
+    If workers is greater than one, pages are downloaded and parsed in a
+    thread pool and are yielded in the order they complete. At most
+    2*workers requests are submitted at a time, and results are dropped
+    once yielded, so memory is bounded by workers rather than by the number
+    of pages. The caller is the only consumer, so database writes stay on
+    a single thread.
+
+    """
+
+    if workers is None or workers < 2:
+      for arg in args:
+        yield (arg, *self._fetchResults( arg, school = school ))
+      return
+
+    args    = iter( args )
+    futures = {}                                                                # Requests in flight
+    with ThreadPoolExecutor( max_workers = workers ) as pool:
+      while True:
+        for arg in args:                                                        # Top up the window of requests
+          futures[ pool.submit( self._fetchResults, arg, school = school ) ] = arg
+          if len(futures) >= 2 * workers: break
+        if not futures: break                                                   # All requests submitted and yielded
+        done, _ = wait( futures, return_when = FIRST_COMPLETED )
+        for future in done:
+          arg = futures.pop( future )                                           # Drop reference so result can be freed once consumed
+          yield (arg, *future.result())
+
+  ##############################################################################
+  def __plan_results_args(self, semester, year, args, dates, schools = None):
+    """
+    Remove arguments for results pages that do not need downloading
+
+    Pages for forecast cities that are finished and whose forecasts and
+    verification are already in the database cannot change, so are
+    dropped. The database is queried only once. If schools is set, the
+    page is only dropped if all of those schools are stored.
+
+    """
+
+    complete = self.get_complete( semester, year )
+    def isComplete( arg ):
+      codes = [arg[3]] if schools is None else schools
+      return all( [(arg[2], arg[4], code,) in complete for code in codes] )
+
+    keep     = [ i for i in range(len(args)) if not (
+      isComplete( args[i] ) and self._isFinal( *args[i][:3] ) ) ]
+    self.__log.info( 'Incremental sync: {} of {} results requests skipped'.format(
+      len(args) - len(keep), len(args) ) )
+    return [args[i] for i in keep], [dates[i] for i in keep]
 
   ##############################################################################
   def __get_results_args_dates(self, years, semesters, identifiers, days, schools = None):
@@ -199,12 +294,10 @@ class WxChallenge( WxSQLite ):
       tag  = '{}:{}'.format(semester.lower(), year);      
       for identifier in identifiers:                                            # Iterate over all identifiers
         if identifier not in self._schedule[tag]: continue;
-        start = self._schedule[tag][identifier]['start'];
         for day in days:                                                        # Iterate over all forecast days
-          offset  = 7 if day > 4 else 0;
-          offset += (day-1) % 4;
-          dates.append( start + timedelta(days = offset) )
+          date = self._schedule.forecastDate( tag, identifier, day )
           for school in schools:                                                # Iterate over all schools
+            dates.append( date )
             args.append( 
               (semester, year, identifier, school, day,)
             )
@@ -7,7 +7,8 @@ from pandas import read_csv
 from WxChallenge.WxChallenge import WxChallenge
 
 from .roster import fix_Roster_CSV
-from .data import fcst_tag, fname_tag, lname_tag, class_tag, grd_df_cols
+from .WxForecast import Forecasts, iter_grades
+from .data import fcst_tag, fname_tag, lname_tag, class_tag, grd_df_cols, gradeCols
 
 
 ################################################################################
@@ -186,7 +187,7 @@ class WxChall_Grades_Excel( object ):
   sheet for each forecast city.
   """
 
-  def __init__(self, semester, year, roster, school=None, verbose=False):
+  def __init__(self, semester, year, roster, school=None, verbose=False, wx=None):
     """
     To initialize the WxChall_Grades_Excel class
 
@@ -199,6 +200,8 @@ class WxChall_Grades_Excel( object ):
     Keyword arguments:
       school   (str): 3-character school tag
       verbose  (bool): Set to increase verbosity
+      wx (WxChallenge): Database to get data from; e.g., shared by many
+        instances. Default is to open a new one
       outdir   (str): Top level output directory for SpreadSheet files.
         Default is same location as roster file
 
@@ -208,7 +211,7 @@ class WxChall_Grades_Excel( object ):
     """
 
     self.__log = logging.getLogger(__name__)
-    self.wx  = WxChallenge()                                                    # Initialize the WxChallenge
+    self.wx  = WxChallenge() if wx is None else wx                              # Initialize the WxChallenge
     self.semester  = semester
     self.year      = year
     self.roster    = roster
@@ -217,7 +220,8 @@ class WxChall_Grades_Excel( object ):
     self.outdir    = None
     self.Workbooks = None                                                       # Parse data from roster CSV
 
-  def grades(self, outdir = None, vacation = None):
+  def grades(self, outdir = None, vacation = None, workers = None, state = False,
+             fcsts = None, model = None, verify = None):
     """
     Compute grades and save data to Excel SpreadSheets
 
@@ -227,6 +231,14 @@ class WxChall_Grades_Excel( object ):
     Keyword arguments:
       outdir (str) : Set output directory for Excel files
       vacation (list) : List of tuples wtih start and end dates of any vacations
+      workers (int) : Number of processes to compute grades in
+      state (bool) : Compute grades from the grade state stored in the
+        database instead of from all forecasts; much faster
+      fcsts (Forecasts) : Forecasts to grade, if already loaded; e.g., by
+        batch_grades. Default is to get them from the database
+      model (Forecasts) : Model forecasts, if already loaded
+      verify (DataFrame) : Verification, if already loaded; see
+        WxSQLite.get_verification
 
     Returns:
       Will create Excel SpreadSheets
@@ -235,23 +247,45 @@ class WxChall_Grades_Excel( object ):
     
     self.outdir    = os.path.dirname(self.roster) if outdir is None else outdir
     self.Workbooks = self.initWorkbooks( self.roster )
-    fcsts = self.wx.get_forecasts( 
-      school   = self.school,
-      semester = self.semester,
-      year     = self.year
-    )                                                                           # Get forecasts based on command line arguments
+    if state:                                                                   # If using grade state
+      grades = self.wx.get_grades( 
+        school   = self.school,
+        semester = self.semester,
+        year     = self.year,
+        vacation = vacation
+      )
+      if len(grades) == 0:                                                      # If no grades returned
+        self.__log.error( 'No forecasts found!' )                               # Print a message
+        return False                                                            # Exit
+      for f in iter_grades( grades ):                                           # Iterate over all the forecasters
+        self.updateSpreadSheets( f )                                            # Call method to update the spreadsheets with the current forecaster's grades
+      self.saveSpreadSheets()                                                   # Save all the spreadsheets
+      return
+
+    if fcsts is None:
+      fcsts = self.wx.get_forecasts( 
+        school   = self.school,
+        semester = self.semester,
+        year     = self.year,
+        columns  = gradeCols,
+        typed    = True
+      )                                                                         # Get forecasts based on command line arguments
 
     if len(fcsts) == 0:                                                         # If no forecasts returned
       self.__log.error( 'No forecasts found!' )                                 # Print a message
       return False                                                              # Exit
-    model = self.wx.get_forecasts( 
-      school   = self.school,
-      semester = self.semester,
-      year     = self.year,
-      models   = True
-    )                                                                           # Get forecasts based on command line arguments
-    verify = set( fcsts.date.values )
-    fcsts.calc_grades( model, verify = self.wx.get_verification( verify ), vacation = vacation )
+    if model is None:
+      model = self.wx.get_forecasts( 
+        school   = self.school,
+        semester = self.semester,
+        year     = self.year,
+        models   = True,
+        columns  = gradeCols,
+        typed    = True
+      )                                                                         # Get forecasts based on command line arguments
+    if verify is None:
+      verify = self.wx.get_verification( set( fcsts.date.values ), aligned = True )
+    fcsts.calc_grades( model, verify = verify, vacation = vacation, workers = workers )
     for f in fcsts.iterForecasters(grades = True):                              # Iterate over all the forecasts again
       self.updateSpreadSheets( f )                                              # Call method to update the spreadsheets with the current forecaster's grades
     self.saveSpreadSheets()                                                     # Save all the spreadsheets
@@ -367,3 +401,89 @@ class WxChall_Grades_Excel( object ):
             fname  = tmp[fname_tag].values                                      # Get forecaster first name values
             Workbooks[cls].fcstrs += zip( fcstID, lname, fname )                # Zip up the forecaster id, last name, and first name and append values to the 'fcstrs' attribute of the ExcelBook object
     return Workbooks                                                            # Return the Workbooks dictionary
+
+################################################################################
+def batch_grades( jobs, outdir = None, workers = None, state = False, verbose = False ):
+  """
+  Compute grades for many rosters and save data to Excel SpreadSheets
+
+  All jobs share one database connection. For each semester, forecasts for
+  the union of the schools of its jobs, model forecasts, and verification
+  are loaded once; each job is then graded on its subset of the forecasts.
+  With state set, nothing is preloaded or shared other than the connection;
+  each job reads its grades from the grade state table.
+
+  A job that fails is logged and returns False; the other jobs still run,
+  and the connection is always closed.
+
+  Arguments:
+    jobs (list) : Dictionaries describing the grading jobs, with keys
+      semester (str), year (int), and roster (str), and optionally schools
+      (str or list), vacation (list of tuples with start and end dates),
+      and outdir (str)
+
+  Keyword arguments:
+    outdir (str)   : Output directory for jobs that do not set one. Default
+      is same location as roster file
+    workers (int)  : Number of processes to compute grades in
+    state (bool)   : Compute grades from the grade state stored in the
+      database instead of from all forecasts
+    verbose (bool) : Set to increase verbosity
+
+  Returns:
+    list : Return value of WxChall_Grades_Excel.grades for each job; False
+      if no forecasts were found for the job, or if grading it failed
+
+  """
+
+  log     = logging.getLogger(__name__)
+  wx      = WxChallenge()                                                       # One database connection for all jobs
+  results = [None] * len(jobs)
+
+  semesters = {}                                                                # Jobs grouped by semester and year
+  for i, job in enumerate( jobs ):
+    schools = job.get('schools', None)
+    if isinstance(schools, str): schools = [schools]
+    key     = (job['semester'].lower(), int(job['year']),)
+    semesters.setdefault( key, [] ).append( (i, job, schools,) )
+
+  try:
+    for (semester, year), group in semesters.items():
+      data = {}
+      if not state:                                                             # Grade state is already summarized in the database
+        union = None                                                            # Schools for all jobs in the semester; None is all schools
+        if all( [schools is not None for i, job, schools in group] ):
+          union = sorted( set( [s for i, job, schools in group for s in schools] ) )
+        log.info( 'Loading forecasts for {} {}, schools: {}'.format(semester, year, union) )
+        try:
+          fcsts = wx.get_forecasts( school = union, semester = semester, year = year,
+                                    columns = gradeCols, typed = True )
+          data['model']  = wx.get_forecasts( semester = semester, year = year, models = True,
+                                             columns = gradeCols, typed = True )  # Model forecasts do not depend on school
+          data['verify'] = wx.get_verification( set( fcsts.date.values ), aligned = True )
+        except Exception:
+          log.exception( 'Failed to load forecasts for {} {}; skipping {} job(s)'.format(semester, year, len(group)) )
+          for i, job, schools in group: results[i] = False
+          continue
+        school         = fcsts.index.get_level_values( 'school' )
+
+      for i, job, schools in group:
+        try:
+          if not state:
+            mask          = np.ones( len(fcsts), dtype = bool ) if schools is None else school.isin( schools )
+            data['fcsts'] = Forecasts( fcsts.loc[ mask ] )                      # New object for each job as grades are stored on it
+          inst = WxChall_Grades_Excel( semester, year, job['roster'],
+            school  = schools,
+            verbose = verbose,
+            wx      = wx )
+          results[i] = inst.grades( outdir   = job.get('outdir', outdir),
+                                    vacation = job.get('vacation', None),
+                                    workers  = workers,
+                                    state    = state,
+                                    **data )
+        except Exception:
+          log.exception( 'Failed to grade job {} ({})'.format(i, job['roster']) )
+          results[i] = False
+  finally:
+    wx.close()                                                                  # Close the connection even if a job raised something other than Exception
+  return results
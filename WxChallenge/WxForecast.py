@@ -1,14 +1,20 @@
 # Import column naming data
 import logging
+import os
 import pandas
 import numpy as np
 
+from concurrent.futures import ProcessPoolExecutor
+
 from .data import forecastCols as cols
-from .data import grd_df_cols, miss_allowed, fcst_per_city
+from .data import grd_df_cols, miss_allowed, fcst_per_city, day_offsets
+
+log            = logging.getLogger(__name__)
 
 required       = fcst_per_city - miss_allowed
 miss_penalize  = 100.0 / required
 climo_penalize =  30.0 / required
+partition_rows = 25000                                                          # Minimum number of forecasts for each worker process when grading in parallel
 
 ##############################################################################
 def get_level_list(vals, levels):
@@ -51,6 +57,61 @@ def calc_error( fcst, verify ):
       error += 0.4
   return error
 
+def _precip_step_error( i ):
+  """
+  Precipitation error, in points, for each hundredth of an inch i
+
+  Each hundredth below 0.10" costs 0.4, from 0.10" to 0.25" 0.3, from
+  0.25" to 0.50" 0.2, and above 0.50" 0.1 points; as in calc_error.
+
+  """
+
+  return np.select( [i >= 50, i >= 25, i >= 10], [0.1, 0.2, 0.3], 0.4 )
+
+def calc_errors( fcst, verify ):
+  """
+  Vectorized version of calc_error
+
+  Errors for all forecasts are computed at once. The precipitation error
+  is added one hundredth at a time, in the same order as calc_error, so
+  the results are identical to calc_error, not just to within rounding;
+  the number of array operations is set by the largest precipitation
+  error, not by the number of forecasts.
+
+  Arguments:
+    fcst (array-like)   : Forecasts of max, min, wind, and precip; the last
+      dimension must be of size 4
+    verify (array-like) : Verification of max, min, wind, and precip; must
+      broadcast against fcst
+
+  Keyword arguments:
+    None.
+
+  Returns:
+    numpy.ndarray : Total error for each forecast
+
+  """
+
+  fcst   = np.asarray( fcst,   dtype = float )
+  verify = np.asarray( verify, dtype = float )
+  error  = (np.abs( np.round(fcst[...,:3]) - verify[...,:3] ) * [1, 1, 0.5]).sum( -1 )
+
+  pf     = np.trunc( np.round(fcst[...,-1], 2) * 100 ).astype( int )            # Precip in hundredths; truncated as in calc_error
+  pv     = np.trunc( verify[...,-1] * 100 ).astype( int )
+  lo     = np.minimum(pf, pv)
+  steps  = np.maximum(pf, pv) - lo
+  error, lo, steps = np.broadcast_arrays( error, lo, steps )
+  shape  = error.shape
+  error  = error.flatten()                                                      # Copy to add precip error to
+  lo, steps = lo.ravel(), steps.ravel()
+  active = np.flatnonzero( steps > 0 )                                          # Forecasts that still have hundredths to add
+  k      = 0
+  while active.size > 0:                                                        # Add kth hundredth to all forecasts with more than k
+    error[active] += _precip_step_error( lo[active] + k )
+    k     += 1
+    active = active[ steps[active] > k ]
+  return error.reshape( shape )
+
 def calc_School_Norm( fcData, verify ):
   if len(verify) == 0:
     raise Exception('Invalid varification data!')
@@ -72,29 +133,490 @@ def get_School_Norm( fcData, verify ):
   This function returns the consensus cumulative error for
   a school and the standard deviation for the cumulative error 
   for the school using information for the latest forecast date
-  in the DataFrame
+  in the DataFrame; see school_consensus
   '''
-  schConsen = fcData.index.get_level_values('name') == 'CONSEN';              # Get consensus for the school for the given station
-  if not any( schConsen ):
-    schConErr = calc_School_Norm( fcData, verify )
-  else:
-    #print( calc_School_Norm( fcData, verify ) )
-    
-    schConsen = fcData.loc[ schConsen ];                                        # Get data for consensus for the school
-    fcstDays  = schConsen.index.get_level_values('day');                        # Get the forecast days for the city, i.e., 1, 2, 3, etc.
-    maxDay    = fcstDays.max();                                                 # Get latest forecast day
-    index     = fcstDays == maxDay;
-    #print( schConsen.loc[index]['cum_err_total'].values );                   # Value of the cumulative consensus error
-    schConErr = schConsen.loc[index]['cum_err_total'].values[0];                   # Value of the cumulative consensus error
-  #print( schConErr )
-
-  fcstDays  = fcData.index.get_level_values('day');
-  maxDay    = fcstDays.max();                                                 # Get latest forecast day
-  category  = fcData.index.get_level_values('category');
-  fcstType  = fcData.type.values
-  index     = (fcstDays == maxDay) & (category < 9) & (fcstType != '')
-  fcConErr  = fcData.loc[index]['cum_err_total'].values;                         # Value of the cumulative consensus error
-  return schConErr, np.std( fcConErr);
+  consen = school_consensus( fcData.reset_index(), verify )
+  return consen['consensus'].values[0], consen['spread'].values[0]
+
+def _verify_frame( verify ):
+  """
+  Max, min, wind, and precip verification indexed by datetime64 date
+
+  verify may be the dictionary or the aligned DataFrame returned by
+  WxSQLite.get_verification; dates without verification are dropped.
+
+  """
+
+  if isinstance(verify, dict):
+    verify = pandas.DataFrame.from_dict( verify, orient = 'index' )
+  verify = verify.iloc[:, -4:].dropna( how = 'all' )                            # Last four columns are max, min, wind, precip
+  verify.index = pandas.to_datetime( verify.index )
+  return verify
+
+def _consensus_error( station, day, dates, fcst, verify, nStat ):
+  """
+  Cumulative error of the mean forecast for each station
+
+  Rows must be grouped by station and day; the mean forecast for each
+  station and day is scored against verification on the date of the first
+  forecast in the group. verify is as returned by _verify_frame.
+
+  """
+
+  new     = np.ones( len(station), dtype = bool )                               # First row of each station and day
+  new[1:] = (station[1:] != station[:-1]) | (day[1:] != day[:-1])
+  starts  = np.flatnonzero( new )
+  if len(starts) == 0: return np.zeros( nStat )
+
+  counts  = np.diff( np.append( starts, len(station) ) )
+  mean    = np.zeros( (len(starts), fcst.shape[1]) )
+  np.add.at( mean, np.repeat( np.arange(len(starts)), counts ), fcst )          # Sum forecasts in row order, as numpy.mean over rows does
+  mean   /= counts[:,None]                                                      # Mean forecast
+  gDates  = pandas.to_datetime( dates[starts] )
+  have    = gDates.isin( verify.index )                                         # Days with verification
+  error   = np.zeros( len(starts) )
+  if have.any():
+    obs         = verify.reindex( gDates[have] ).values.astype( float )         # Verification aligned to days
+    error[have] = calc_errors( mean[have], obs )
+  return np.bincount( station[starts], weights = error, minlength = nStat )
+
+def school_consensus( data, verify = None ):
+  """
+  School consensus error and spread for every school and forecast city
+
+  Arguments:
+    data (DataFrame) : Forecasts with index levels as columns (e.g., from
+      Forecasts.reset_index()); rows for each station (school, year,
+      semester, identifier) must be contiguous and in day order
+
+  Keyword arguments:
+    verify (DataFrame, dict) : Verification indexed by date; see
+      WxSQLite.get_verification, preferably with aligned set. Required if
+      any station does not have a school consensus (CONSEN) entry
+
+  Returns:
+    DataFrame : Indexed by station number, in order of first appearance;
+      consensus is cumulative error of the school consensus (from the CONSEN
+      entry if there is one, else computed), computed is cumulative error of
+      the mean human forecast, and spread is the standard deviation of
+      cumulative error of forecasters on the latest forecast day
+
+  """
+
+  levels  = ['school', 'year', 'semester', 'identifier']
+  station = data.groupby( levels, sort = False, observed = True ).ngroup().values  # Station number of each row
+  nStat   = station.max() + 1 if len(station) > 0 else 0
+  day     = data['day'].values
+  cumErr  = data['cum_err_total'].values.astype( float )
+  human   = np.asarray( data['type'] ) != ''                                    # Forecasts that are human; i.e., not guidance or climo
+
+  maxDay  = pandas.Series( day ).groupby( station ).transform( 'max' ).values    # Latest forecast day of each station
+  index   = (day == maxDay) & (data['category'].values < 9) & human
+  spread  = pandas.Series( cumErr[index] ).groupby( station[index] ).std( ddof = 0 ).reindex( range(nStat) ).values
+
+  isCon   = np.asarray( data['name'] ) == 'CONSEN'                              # Consensus for the school
+  con     = pandas.DataFrame( {'station' : station[isCon], 'day' : day[isCon], 'err' : cumErr[isCon]} )
+  con     = con.loc[ con['day'].values == con.groupby('station')['day'].transform('max').values ]  # Latest consensus forecast day
+  con     = con.drop_duplicates( 'station' ).set_index( 'station' )['err']
+  hasCon  = np.isin( np.arange(nStat), con.index.values )
+
+  computed = np.full( nStat, np.nan )
+  if verify is not None and len(verify) > 0:
+    fcst     = data[['max','min','wind','precip']].values[human].astype( float )
+    computed = _consensus_error( station[human], day[human], data['date'].values[human], fcst,
+                                 _verify_frame( verify ), nStat )
+  elif not hasCon.all():
+    raise Exception('Invalid varification data!')
+
+  consensus = np.where( hasCon, con.reindex( range(nStat) ).values.astype( float ), computed )
+  return pandas.DataFrame( {'consensus' : consensus, 'computed' : computed, 'spread' : spread} )
+
+def _absence_penalty( nmiss ):
+  """Absence deduction; miss_allowed free misses before deductions"""
+
+  return -np.clip(nmiss-miss_allowed, 0, None) * miss_penalize
+
+def _climo_penalty( nbeat ):
+  """Deduction for number of forecasts worse than climatology"""
+
+  return -climo_penalize * np.clip(nbeat, 0, required)
+
+def _school_bonus( sch_err, err, sch_std ):
+  """Normalized difference between school consensus error and forecaster error"""
+
+  return np.round( np.clip( (sch_err - err) / sch_std, 0.0, None ), 2 )        # Round to 2 decimal places
+
+def _national_bonus( norm ):
+  """Bonus based on normalized error relative to national consensus"""
+
+  return np.round( np.clip( -norm / 10.0, -1.0, None ) + 1.0, 2 )
+
+def _popcount( mask, nbits = fcst_per_city ):
+  """Number of bits set in each value of integer array"""
+
+  bits = np.left_shift( 1, np.arange( nbits ) )
+  return ((np.asarray( mask, dtype = np.int64 )[:,None] & bits) != 0).sum( 1 )
+
+def vacation_mask( dates, vacation ):
+  """
+  Flag dates that are within any vacation
+
+  Vacations are merged into sorted, non-overlapping intervals once, and
+  each date is located with a binary search.
+
+  Arguments:
+    dates (array-like) : Dates to check
+    vacation (list)    : List of tuples with start and end dates of any
+      vacations; inclusive
+
+  Keyword arguments:
+    None.
+
+  Returns:
+    numpy.ndarray : True where date is within a vacation
+
+  """
+
+  if not vacation: return np.zeros( np.shape(dates), dtype = bool )
+  dates = np.asarray( dates, dtype = 'datetime64[D]' )
+
+  starts, ends = [], []
+  for start, end in sorted( (np.datetime64(vaca[0], 'D'), np.datetime64(vaca[1], 'D'),) for vaca in vacation ):
+    if starts and start <= ends[-1] + np.timedelta64(1, 'D'):                   # Overlaps, or is next to, previous vacation
+      ends[-1] = max( ends[-1], end )
+    else:
+      starts.append( start )
+      ends.append( end )
+  starts = np.asarray( starts, dtype = 'datetime64[D]' )
+  ends   = np.asarray( ends,   dtype = 'datetime64[D]' )
+
+  i = np.searchsorted( starts, dates, side = 'right' ) - 1                      # Last vacation starting on or before each date
+  return (i >= 0) & (dates <= ends[ np.clip(i, 0, None) ])
+
+def grade_segments( starts, absent, in_vacation, err, cum_err, norm, sch_err, sch_std,
+                    climo_err = None, climo_norm = None, has_climo = None ):
+  """
+  Compute grades for forecasters from sorted forecast data
+
+  Forecasts for each forecaster at a station must be contiguous and in day
+  order. All values are computed as reductions over these segments.
+
+  Arguments:
+    starts (ndarray)  : Index of the first forecast of each forecaster
+    absent (ndarray)  : Cumulative absences for each forecast
+    in_vacation (ndarray) : Flag for forecasts during a vacation; see vacation_mask
+    err (ndarray)     : Error of each forecast
+    cum_err (ndarray) : Cumulative error of each forecast
+    norm (ndarray)    : Normalized cumulative error for the city of each forecast
+    sch_err (ndarray) : School consensus cumulative error for each forecaster
+    sch_std (ndarray) : Standard deviation of cumulative error of the school
+      for each forecaster
+
+  Keyword arguments:
+    climo_err (ndarray)  : Climatology error aligned with each forecast
+    climo_norm (ndarray) : Climatology normalized error aligned with each forecast
+    has_climo (ndarray)  : Flag for forecasters that are compared to climatology
+
+  Returns:
+    tuple : Arrays of number of forecasts, absence deduction, number of
+      vacation forecasts, climatology deduction, school consensus bonus,
+      national consensus bonus, and score for each forecaster
+
+  """
+
+  nrows  = len(absent)
+  ends   = np.append( starts[1:], nrows )
+  ndays  = ends - starts                                                        # Number of forecast days
+  last   = ends - 1                                                             # Index of latest forecast
+  miss   = np.empty( nrows, dtype = absent.dtype )
+  miss[1:]     = absent[1:] - absent[:-1]                                       # Binary flag for if forecaster missed a forecast day
+  miss[starts] = absent[starts]
+  nmiss  = np.maximum.reduceat( absent, starts )                                # Get the number of missed forecasts; the maximum number from the abs column
+  vacaN  = np.add.reduceat( in_vacation.astype( np.int64 ), starts )           # Number of forecast days during vacations
+  nmiss  = nmiss - vacaN                                                        # Remove number of days of break from missed forecasts count
+  vacaN  = vacaN - np.add.reduceat( np.where( in_vacation, miss, 0 ), starts )  # Forecasts made during vacations
+
+  nFcsts  = ndays - nmiss                                                       # Number of forecasts submitted
+  abse    = _absence_penalty( nmiss )                                           # Compute absence deductions
+  sch_con = _school_bonus( sch_err, cum_err[last], sch_std )
+  ntl_con = _national_bonus( norm[last] )
+
+  climo   = np.zeros( len(starts) )
+  if has_climo is not None:
+    beat  = (miss == 0) & (climo_err < err) & (climo_norm / 10.0 > 3.0)         # Forecast NOT missed, climatology error less than forecast error, and normalized climo error worse than 3 standard deviations from national consensus
+    beat  = np.add.reduceat( beat.astype( np.int64 ), starts )
+    climo = np.where( has_climo, _climo_penalty( beat ), 0.0 )
+
+  score = 100.0 + abse + climo                                                  # Compute score; do NOT include beating national or school consensus
+  return nFcsts, abse, vacaN, climo, sch_con, ntl_con, score
+
+def _climo_frame( model ):
+  """Climatology error and normalized error for each forecast city and day"""
+
+  keys = ['year', 'semester', 'identifier', 'day']
+  md   = model.reset_index()
+  md   = md.loc[ np.asarray( md['name'] ) == 'CLIMO_', keys + ['err_total', 'norm_city'] ]
+  return md.drop_duplicates( keys )
+
+def _join_climo( climo, fcst, starts ):
+  """
+  Climatology error and normalized error for each forecast, joined on
+  forecast city and day. Forecasts without climatology for their day
+  are not compared; a warning is logged for each city where this happens.
+  """
+
+  keys   = ['year', 'semester', 'identifier', 'day']
+  joined = fcst[ keys ].merge( climo, how = 'left', on = keys, indicator = True )  # Climatology for each forecast; in forecast order
+
+  climoErr  = joined['err_total'].values.astype( float )
+  climoNorm = joined['norm_city'].values.astype( float )
+  have      = (joined['_merge'] == 'both').values
+  hasClimo  = np.add.reduceat( have.astype( np.int64 ), starts ) > 0            # Forecasters with climatology for any day
+
+  missing = joined.loc[ ~have, keys ].drop_duplicates()                         # Forecast days without climatology
+  for (year, semester, ident), days in missing.groupby( keys[:3], observed = True )['day']:
+    log.warning( 'No climatology for {} {} {} day(s) {}; not compared'.format(
+      ident, semester, year, sorted( days.tolist() ) ) )
+  return climoErr, climoNorm, hasClimo
+
+def grade_forecasts( data, climo = None, verify = None, vacation = None, index = None ):
+  """
+  Compute grades for all forecasters in forecasts
+
+  Data are sorted once so that the forecasts of each forecaster at each
+  station are contiguous and in day order; all grades are then computed
+  with reductions over these segments; see grade_segments. Stations are
+  graded independently, so any subset of whole stations can be graded on
+  its own; see grade_partitions.
+
+  Arguments:
+    data (DataFrame) : Forecasts indexed as in Forecasts; index must be sorted
+
+  Keyword arguments:
+    climo (DataFrame)  : Climatology for forecast cities; see _climo_frame
+    verify (DataFrame) : Verification; see school_consensus
+    vacation (list)    : List of tuples with start and end dates of any vacations
+    index (list)       : Columns to include from the index of data
+
+  Returns:
+    DataFrame : Columns of index, then grd_df_cols, for each forecaster.
+      The school consensus bonus is NOT yet normalized
+
+  """
+
+  levels  = ['school','year','semester','identifier']                           # Levels defining a station
+  data    = data.reset_index()                                                  # Index is sorted, so rows for each station are contiguous and in day order
+  station = data.groupby( levels, sort = False, observed = True ).ngroup().values  # Station number of each row
+  consen  = school_consensus( data, verify )                                    # School consensus error and spread for each station
+  schErr, schStd = consen['consensus'].values, consen['spread'].values
+
+  names   = np.asarray( data['name'] )
+  fcst    = data.loc[ names != 'CONSEN' ].assign( _station = station[names != 'CONSEN'] )  # Skip consensus
+  fcst    = fcst.sort_values( ['_station', 'name'], kind = 'mergesort' )         # Stable sort keeps day order for each forecaster
+  stat    = fcst['_station'].values
+  names   = np.asarray( fcst['name'] )
+  new     = np.ones( len(fcst), dtype = bool )                                  # Flag for first row of each forecaster at a station
+  new[1:] = (stat[1:] != stat[:-1]) | (names[1:] != names[:-1])
+  starts  = np.flatnonzero( new )
+  gStat   = stat[starts]                                                        # Station of each forecaster
+
+  climoErr = climoNorm = hasClimo = None
+  if climo is not None:                                                         # If climatology is NOT None
+    climoErr, climoNorm, hasClimo = _join_climo( climo, fcst, starts )
+
+  with np.errstate( divide = 'ignore', invalid = 'ignore' ):
+    results = grade_segments( starts, 
+                              fcst['abs'].values.astype( np.int64 ), 
+                              vacation_mask( fcst['date'].values, vacation ),   # Forecasts during vacations
+                              fcst['err_total'].values.astype( float ), 
+                              fcst['cum_err_total'].values.astype( float ), 
+                              fcst['norm_city'].values.astype( float ),
+                              schErr[gStat], schStd[gStat],
+                              climo_err = climoErr, climo_norm = climoNorm, has_climo = hasClimo )
+
+  grades = fcst.iloc[ starts ][ index or [] ].reset_index( drop = True )        # Index values are from the first forecast of each forecaster
+  for col, vals in zip( grd_df_cols, results ):
+    grades[col] = vals
+  return grades
+
+def pool_size( data, workers ):
+  """
+  Number of worker processes worth using to grade forecasts
+
+  Limited to the number of CPUs and to one process for each partition_rows
+  forecasts, below which sending forecasts to a worker costs more than
+  grading them. Forecasts with object columns (e.g., not loaded with
+  get_forecasts(typed=True)) cost more to send to workers than to grade
+  in this process, so are not graded in parallel.
+
+  Returns:
+    int : Number of processes; less than two if grading in this process
+
+  """
+
+  if workers is None or workers < 2: return 1
+  if any( [dtype == object for dtype in data.dtypes] ): return 1
+  return min( workers, os.cpu_count() or 1, len(data) // partition_rows )
+
+def _grade_partition( args ):
+  """Grade one partition in a worker process; see grade_forecasts"""
+
+  return grade_forecasts( *args )
+
+def grade_partitions( workers, data, climo = None, verify = None, vacation = None, index = None ):
+  """
+  Compute grades for all forecasters in forecasts in a pool of processes
+
+  Forecasts are split into partitions of whole stations (school and
+  forecast city), and each partition is graded with grade_forecasts in a
+  worker; i.e., consensus, climatology join, sorting, and grading all run
+  in the workers. There is one partition per worker, as each call has a
+  fixed cost. Results are concatenated in order, so are the same as from
+  grade_forecasts on all data.
+
+  Arguments:
+    workers (int)    : Number of processes
+    data (DataFrame) : Forecasts indexed as in Forecasts; index must be sorted
+
+  Keyword arguments:
+    See grade_forecasts
+
+  Returns:
+    DataFrame : See grade_forecasts
+
+  """
+
+  nrows  = len(data)
+  codes  = [data.index.codes[ data.index.names.index(lvl) ] 
+              for lvl in ['school', 'year', 'semester', 'identifier']]
+  new    = np.zeros( nrows, dtype = bool )                                      # Flag for first row of each station
+  for code in codes:
+    new[1:] |= code[1:] != code[:-1]
+  bounds = np.flatnonzero( new )                                                # Rows where stations start, excluding first
+
+  splits = np.searchsorted( bounds, np.linspace( 0, nrows, workers+1 )[1:-1] )  # One partition per worker; station boundary at or after even split of rows
+  splits = np.unique( np.concatenate( ( [0], bounds[ splits[splits < len(bounds)] ], [nrows] ) ) )
+
+  data   = pandas.DataFrame( data )                                             # Plain DataFrame for sending to workers
+  tasks  = [ (data.iloc[r0:r1], climo, verify, vacation, index,) 
+               for r0, r1 in zip( splits[:-1], splits[1:] ) ]
+  with ProcessPoolExecutor( max_workers = workers ) as pool:
+    results = list( pool.map( _grade_partition, tasks ) )
+  return pandas.concat( results, ignore_index = True )
+
+def grades_from_state( state, vacation = None, climo = True, school_norm = None ):
+  """
+  Compute grades for forecasters from grade state
+
+  Grade state (see WxSQLite.refresh_grade_state) summarizes the forecasts
+  of each forecaster at a forecast city, so grades are computed in constant
+  time per forecaster, without the forecasts.
+
+  Arguments:
+    state (DataFrame) : Grade state; columns as in data.gradeStateCols
+
+  Keyword arguments:
+    vacation (list) : List of tuples with start and end dates of any vacations
+    climo (bool)    : Compare forecasters to climatology; forecasts are
+      compared on days with climatology for the forecast city
+    school_norm (callable) : Function returning school consensus error for
+      a (school, year, semester, identifier) station without a school
+      consensus (CONSEN) entry
+
+  Returns:
+    DataFrame : Grades; as in Forecasts.grades
+
+  """
+
+  levels   = ['school', 'year', 'semester', 'identifier']
+  gradeInd = levels + ['category', 'name']
+  station  = state.groupby( levels, sort = False ).ngroup().values
+  nStat    = station.max() + 1 if len(station) > 0 else 0
+  lastDay  = state['last_day'].values
+  cumErr   = state['cum_err'].values.astype( float )
+
+  maxDay   = state.groupby( station )['last_day'].transform( 'max' ).values     # Latest forecast day of each station
+  index    = ( (lastDay == maxDay) & (state['category'].values < 9) & 
+               (state['human'].fillna(0).values != 0) )
+  schStd   = pandas.Series( cumErr[index] ).groupby( station[index] ).std( ddof = 0 ).reindex( range(nStat) ).values
+
+  isCon    = state['name'].values == 'CONSEN'                                   # Consensus for the school
+  schErr   = pandas.Series( cumErr[isCon], index = station[isCon] )
+  schErr   = schErr[ ~schErr.index.duplicated() ].reindex( range(nStat) ).values.astype( float )
+  for i in np.setdiff1d( np.arange(nStat), station[isCon] ):                    # Stations without school consensus
+    if school_norm is not None:
+      schErr[i] = school_norm( tuple( state.loc[ station == i, levels ].iloc[0] ) )
+
+  fcst    = state.loc[ ~isCon ]
+  stat    = station[ ~isCon ]
+  ndays   = fcst['ndays'].values.astype( np.int64 )
+  nmiss   = fcst['nmiss'].values.astype( np.int64 )
+  vacaN   = np.zeros( len(fcst), dtype = np.int64 )
+  if vacation:                                                                  # If there were vacations input
+    bits    = np.left_shift( 1, np.arange( fcst_per_city ) )
+    present = (fcst['day_mask' ].values.astype( np.int64 )[:,None] & bits) != 0 # Days with forecast
+    missed  = (fcst['miss_mask'].values.astype( np.int64 )[:,None] & bits) != 0 # Days forecast missed
+    offsets = np.asarray( day_offsets, dtype = 'timedelta64[D]' )
+    start   = ( np.asarray( fcst['first_date'], dtype = 'datetime64[D]' ) - 
+                offsets[ fcst['first_day'].values.astype( int ) - 1 ] )         # Start date of forecast city
+    vacaID  = vacation_mask( start[:,None] + offsets, vacation )                # Forecast days during vacations
+    vacaN   = (vacaID & present).sum( 1 )
+    nmiss   = nmiss - vacaN                                                     # Remove number of days of break from missed forecasts count
+    vacaN   = vacaN - (vacaID & missed).sum( 1 )
+
+  climoPen = np.zeros( len(fcst) )
+  if climo:
+    climoDays = fcst['climo_days'].values
+    hasClimo  = climoDays > 0                                                   # Climatology joined on forecast day, so compare if any
+    climoPen  = np.where( hasClimo, _climo_penalty( _popcount( fcst['climo_mask'].values ) ), 0.0 )
+    short     = climoDays < pandas.Series( ndays ).groupby( stat ).transform( 'max' ).values
+    for key in fcst.loc[ short, levels[1:] ].drop_duplicates().itertuples( index = False ):
+      log.warning( 'Climatology missing for some days at {2} {1} {0}; not compared'.format( *key ) )
+
+  with np.errstate( divide = 'ignore', invalid = 'ignore' ):
+    sch_con = _school_bonus( schErr[stat], fcst['cum_err'].values.astype( float ), schStd[stat] )
+  abse    = _absence_penalty( nmiss )
+  results = [ ndays - nmiss, abse, vacaN, climoPen, sch_con,
+              _national_bonus( fcst['norm_city'].values.astype( float ) ),
+              100.0 + abse + climoPen ]
+
+  grades  = fcst[ gradeInd ].reset_index( drop = True )
+  for col, vals in zip( grd_df_cols, results ):
+    grades[col] = vals
+  grades.set_index( gradeInd, inplace = True )
+  school_con = grades[ grd_df_cols[-3] ].values
+  grades[ grd_df_cols[-3] ] = (school_con / school_con.max())
+  return grades
+
+def iter_grades( grades ):
+  """Generator yielding a ForecasterView with grades for each forecaster"""
+
+  return iter_views( grades, True )
+
+def iter_views( data, grades = False ):
+  """
+  Generator yielding a ForecasterView for each forecaster in data
+
+  Rows are stable sorted by forecaster once, so that each forecaster is a
+  contiguous block of rows; views point into the sorted data by row offset
+  and do not copy it. Forecasters are yielded in order of first appearance.
+
+  Arguments:
+    data (DataFrame) : Forecasts or grades indexed as in Forecasts
+
+  Keyword arguments:
+    grades (bool) : Set if data are grades
+
+  """
+
+  codes, names = pandas.factorize( data.index.get_level_values( 'name' ) )      # Forecaster number of each row, in order of first appearance
+  order  = np.argsort( codes, kind = 'stable' )
+  data   = data.iloc[ order ]
+  levels = { lvl : data.index.get_level_values( lvl ).values 
+             for lvl in ['category', 'school', 'semester', 'year', 'identifier'] }
+  bounds = np.searchsorted( codes[order], np.arange( len(names) + 1 ) )         # Row bounds of each forecaster
+  for i, name in enumerate( names ):
+    yield ForecasterView( data, levels, bounds[i], bounds[i+1], name, grades )
 
 ################################################################################
 class Forecasts( pandas.DataFrame ):
@@ -150,7 +672,7 @@ class Forecasts( pandas.DataFrame ):
     #return data, uniq;                                                          # Return all data AND the uniq values
 
 
-  def calc_grades(self, model = None, verify = None, vacation = None):
+  def calc_grades(self, model = None, verify = None, vacation = None, workers = None):
     '''
     Purpose:
       Method for calculating grades for forecasters
@@ -161,93 +683,31 @@ class Forecasts( pandas.DataFrame ):
     Keywords:
       model    : Model data to compare to
       vacation : List of tuples with start and end dates of any vacations
+      workers  : Maximum number of processes to grade schools/cities in;
+                  default is to grade in this process. See pool_size and
+                  grade_partitions
+    Note:
+      See grade_forecasts
     '''
 
     gradeCol, gradeInd = self.gradeColInd()                                     # Get the column and index names to be used in the final grades DataFrame
-    grades = []                                                                 # Initialize a list to store grades during iteration
-    levels = ['school','year','semester','identifier']                          # List of levels to sort by when iterating
-    stVal, stUNIQ = self.get_lvl_vals( levels )                                 # Get complete list of levels and list of unique levels
-
-    if model is not None:                                                       # If model is NOT None
-      mdVal, mdUNIQ = model.get_lvl_vals( levels[1:] )                          # Get complete list of levels and list of unique levels; don't use the school value
-      if len(stUNIQ) != len(mdUNIQ):                                            # If the length of unique values from the forecasts does NOT match that of the model
-        self.__log.warning( 'Forecaster and model data missmatch!' )            # Print a message
-        model = None                                                            # Disable model
-
-    for stid in stUNIQ:                                                         # Iterate over the unique levels
-      locStat   = self.get_indices( stVal, stid )                               # Get location of unique station
-      fcData    = self.loc[ locStat ]                                           # Subset the forecasts using the location
-      schConErr, schErrSTD = get_School_Norm( fcData, verify )
-
-      if model is not None:                                                     # If model is NOT None
-        locStat     = self.get_indices( mdVal, stid[1:] );                      # Get location of unique station in the model data
-        mdData      = model.loc[ locStat ];                                     # Subset the modeld data using the location
-        mdNames     = mdData.index.get_level_values('name');                    # Get list of level names from the subset data
-        #climatology = mdNames == 'CLIMO0';                                      # Get location of climatology data for the location
-        climatology = mdNames == 'CLIMO_';                                      # Get location of climatology data for the location
-        climatology = mdData.loc[ climatology ];                                # Subset climatology data for the location
-      
-      for fcstr in self.level_iter( 'name', fcData, ['CONSEN'] ):               # Iterate over all the forecasters for the station, skipping consensus
-        print( fcstr )
-        numDays = len( fcstr );                                                 # Number of forecast days
-        if numDays == 0: 
-          self.__log.warning( 'No forecasts found!' );
-          continue;                                                             # If there are NO forecasts for the day, continue
-
-        abse    = 0.0
-        climo   = 0.0
-        sch_con = 0.0
-        ntl_con = 0.0;                              # Initialize absence, climatology, school consensus, and national consensus deductions/bonuses to zero (0.0)
-        vacaN   = 0
-        miss    = fcstr['abs'].values;                                          # Cumulative absence array
-        miss    = np.insert( (miss[1:] - miss[0:-1]), 0, miss[0]);              # Binary flag for if forecaster missed a forecast day
-        nmiss   = fcstr['abs'].values.max();                                    # Get the number of missed forecasts; the maximum number from the abs column
-        print( nmiss )
- 
-        if isinstance( vacation, (list, tuple,) ):                              # If there were vacations input
-          for vaca in vacation:                                                 # Iterate over the vacations
-            vacaID = ( (fcstr['date'].values >= vaca[0]) & 
-                      (fcstr['date'].values <= vaca[1]) )                       # Indices for days at given forecast city that are within the break
-            vacaN  = sum( vacaID )
-            if vacaN > 0:
-              self.__log.debug( 'Found {} forecasts during break'.format(vacaN) )
-              nmiss  -= vacaN;                                                  # Remove number of days of break from missed forecasts count
-              vacaN  -= sum( miss[vacaID] )
-        nFcsts  = numDays - nmiss;                                              # Number of forecasts submitted
-        print()
-        abse    = -np.clip(nmiss-miss_allowed, 0, None) * miss_penalize         # Compute absence deductions; 2 free misses before deductions
-        err     = fcstr['cum_err_total'].values[-1];                            # Get cumulative error value
-
-        sch_con = np.clip( (schConErr - err) / schErrSTD, 0.0, None );          # Normalized difference between school error and forecaster error
-        sch_con = round(sch_con, 2)                                             # Round to 2 decimal places
-        ntl_con = np.clip( -fcstr['norm_city'].values[-1] / 10.0, -1.0, None)+1.0
-        ntl_con = round(ntl_con, 2)
-
-        #tmp = fcstr.index.get_level_values('name')
-        #if 'sawi24' in tmp:
-        #  print(fcstr.norm_city)
-        #  print( ntl_con)
-
-        if model is not None:                                                   # If model is NOT none
-          if len(climatology) == numDays:                                       # If the climatology data ar the same length as the forecaster data
-            fcstErr   = fcstr[      'err_total'].values;                        # Daily error for the forecaster
-            climoErr  = climatology['err_total'].values;                        # Daily error for climatology
-            climoNorm = climatology['norm_city'].values / 10.0;                 # Cumulative normalized climatology error for the city; scaled back to standard deviations
-
-            climo = (miss == False) & (climoErr < fcstErr) & (climoNorm > 3.0); # Boolean for forecast NOT missed, climatology error less than forecast error, and normalized climo error worse than 2 standard deviations from national consensus
-            climo = -climo_penalize * np.clip(sum(climo), 0, required);         # Multiply by climo penalization
-
-        score = 100.0 + abse + climo;                                           # Compute score; do NOT include beating national or school consensus
-        indVals = get_level_list(fcstr, gradeInd);                              # Get the values for, what will be, the index columns
-        grades.append( 
-          indVals + [nFcsts, abse, vacaN, climo, sch_con, ntl_con, score]
-        );# Append grades to the grades list
-    self.grades = pandas.DataFrame(grades, columns = gradeCol);                 # Initialize DataFrame using grades list and gradeCols for columns
+    climo   = None if model  is None else _climo_frame( model )                 # Climatology for forecast cities
+    verify  = None if verify is None else _verify_frame( verify )
+    nproc   = pool_size( self, workers )
+    if nproc > 1:                                                               # Grade partitions of schools/cities in process pool
+      grades = grade_partitions( nproc, self, climo, verify, vacation, gradeInd )
+    else:
+      if workers is not None and workers > 1:
+        self.__log.debug( 'Grading in one process; too few CPUs or forecasts, or forecasts not typed' )
+      grades = grade_forecasts( self, climo, verify, vacation, gradeInd )
+
+    self.grades = grades
     if gradeInd is not None:                                                    # If columns to use as indices is NOT None
       self.grades.set_index(gradeInd, inplace=True);                            # Set columns to use as indices; inplace
     
     school_con = self.grades[ gradeCol[-3] ].values
     self.grades[ gradeCol[-3] ] = (school_con / school_con.max())
+
   ##############################################################################
   def iterForecasters(self, grades = False):
     '''
@@ -260,21 +720,12 @@ class Forecasts( pandas.DataFrame ):
     Inputs:
        None.
     Outputs:
-       Yields a forecaster instance
+       Yields a ForecasterView instance
     Keywords:
        grades : Set to return forecaster instance containing grades.
                  Default is to return instance containing raw scores.
     '''
-    if grades:
-      names = self.grades.index.get_level_values( 'name' );                     # Get all unique forecaster names
-    else:
-      names = self.index.get_level_values( 'name' );                            # Get all unique forecaster names
-    namesUNIQ = names.unique();
-    for name in namesUNIQ:
-      if grades:
-        yield Forecaster( self.grades.loc[ names == name ], name, grades);
-      else:
-        yield Forecaster( self.loc[ names == name ], name, grades );
+    return iter_views( self.grades if grades else self, grades )                # View of each forecaster in the data
   ##############################################################################
   def gradeColInd(self):
     '''
@@ -478,3 +929,85 @@ class Forecaster( pandas.DataFrame ):
       self.semester == comp.semester   and
       self.year     == comp.year
     )   
+
+################################################################################
+class ForecasterView( object ):
+  '''
+  Lightweight view of the data for a single forecaster
+
+  Points into the rows of a parent DataFrame that is sorted by forecaster
+  (see iter_views) rather than copying them, and exposes the same
+  attributes as the Forecaster class.
+  '''
+
+  __slots__ = ('_data', '_levels', '_start', '_stop', 'name', 'category', 'school', 
+               'semester', 'year', 'is_grades', 'is_climo', 'is_model', 'is_consen')
+
+  def __init__(self, data, levels, start, stop, name, grades = False):
+    self._data     = data
+    self._levels   = levels
+    self._start    = start
+    self._stop     = stop
+    self.name      = name
+    self.category  = levels['category'][start]
+    self.school    = levels['school'  ][start]
+    self.semester  = levels['semester'][start]
+    self.year      = levels['year'    ][start]
+    self.is_grades = grades
+    self.is_climo  = 'CLIMO' in name.upper()
+    self.is_model  = self.category == 8
+    self.is_consen = self.category == 9
+
+  def __len__(self):
+    return self._stop - self._start
+
+  @property
+  def data(self):
+    '''DataFrame of the rows for the forecaster'''
+    return self._data.iloc[ self._start:self._stop ]
+
+  @property
+  def loc(self):
+    return self.data.loc
+
+  @property
+  def index(self):
+    return self._data.index[ self._start:self._stop ]
+
+  @property
+  def values(self):
+    return self.data.values
+
+  def getCities(self):
+    '''
+    Name:
+       getCities
+    Purpose:
+       A method to return all unique city names for the forecaster
+    Inputs:
+       None.
+    Outputs:
+       Returns a numpy ndarray containing unique city identifiers
+    Keywords:
+       None.
+    '''
+    vals = pandas.unique( self._levels['identifier'][ self._start:self._stop ] )  # Get all 'identifier' values, find just unique
+    return np.asarray( vals ).astype( str )
+
+  def exists(self, name, category, school, semester, year):
+    return (
+      self.name     == name       and 
+      self.category == category   and
+      self.school   == school     and
+      self.semester == semester   and
+      self.year     == year
+    )   
+
+  def __eq__(self, comp):
+    return (
+      self.name     == comp.name       and 
+      self.category == comp.category   and
+      self.school   == comp.school     and
+      self.semester == comp.semester   and
+      self.year     == comp.year
+    )
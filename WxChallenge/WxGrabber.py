@@ -1,19 +1,92 @@
 import logging
+import random
+import time
 import requests
 import warnings
 
+from collections import namedtuple
+from requests.adapters import HTTPAdapter
+from lxml import html as lxmlHTML
+
 from .utils import *
 from . import data as WxData
+from .WxCache import WxCache
+
+ForecastRow = namedtuple('ForecastRow', [col['name'] for col in WxData.forecastCols]) # Compact forecast record with values in SQL forecasts table column order
+
+def _toNumber( val ):
+  """Convert string to int or float if possible"""
+
+  if val.isdigit():                                                             # If the element is a digit
+    return int(val)                                                             # Return integer type of element
+  try:                                                                          # Try to...
+    return float(val)                                                           # Convert element to float
+  except ValueError:                                                            # If convert to float fails
+    return val                                                                  # Keep as string
+
+def _toInteger( val ):
+  """Convert string to int; other values are converted as by _toNumber"""
+
+  try:
+    return int(val)
+  except ValueError:
+    return _toNumber(val)
+
+def _toReal( val ):
+  """Convert string to float if possible"""
+
+  try:
+    return float(val)
+  except ValueError:
+    return val
 
 class WxGrabber(object):
   _BASE_URL = 'https://wxchallenge.com'
   _RESULTS  = '{}/results.php'.format(  _BASE_URL )
   _SCHEDULE = '{}/schedule.php'.format( _BASE_URL )
 
-  def __init__(self, *args, verify = False, **kwargs):
+  def __init__(self, *args, verify = False, pool_size = 10, retries = 3, 
+               backoff = 0.5, timeout = (5.0, 30.0), cache = None, 
+               cache_ttl = 3600.0, offline = False, parser = 'bs4', **kwargs):
+    """
+    Arguments:
+      None.
+
+    Keyword arguments:
+      verify    (bool)  : Verify SSL certificates of the WxChallenge server
+      pool_size (int)   : Number of keep-alive connections to hold open
+      retries   (int)   : Number of times to retry a failed request
+      backoff   (float) : Base delay, in seconds, for exponential backoff
+        between retries; some random jitter is added to each delay
+      timeout   (float, tuple) : Connect/read timeout, in seconds, passed
+        to every request
+      cache     (bool, str) : Set to cache downloaded pages on disk; if a
+        string, it is the directory to store pages in
+      cache_ttl (float) : Time-to-live, in seconds, of cached pages that may
+        still change; pages for finished forecast periods never expire
+      offline   (bool)  : Only serve pages from the cache; nothing is
+        downloaded, and cached pages never expire. Implies cache
+      parser    (str)   : Parser for results pages; 'bs4' for BeautifulSoup
+        or 'lxml' for the faster, lxml-based parser
+
+    """
+
     super().__init__(*args, **kwargs)
-    self.__log   = logging.getLogger( __name__ )
-    self._verify = verify
+    self.__log    = logging.getLogger( __name__ )
+    self._verify  = verify
+    self._retries = retries
+    self._backoff = backoff
+    self._timeout = timeout
+    self._offline = offline
+    self._parser  = parser
+    self._cache   = None
+    if cache or offline:                                                        # If cache or offline is set
+      path        = cache if isinstance(cache, str) else None
+      self._cache = WxCache( path, ttl = cache_ttl )
+    self._session = requests.Session()                                          # Persistent session so connections are re-used across requests
+    adapter       = HTTPAdapter( pool_connections = pool_size, pool_maxsize = pool_size )
+    self._session.mount( 'https://', adapter )
+    self._session.mount( 'http://',  adapter )
     if not verify:
       warnings.warn('InsecureRequestWarning : You have chosen to allow insecure connection to the WxChallenge server')
       warnings.filterwarnings('ignore', message='Unverified HTTPS request')
@@ -33,10 +106,12 @@ class WxGrabber(object):
       None.
 
     Returns:
-      BeautifulSoup parsed HTML data containing forecasting results
+      WxResults object containing forecasting results
 
     """
 
+    final = self._isFinal( semester, year, identifier )                         # Results for finished forecast cities do not change; schedule uses calendar year of semester
+
     if semester.lower() == 'spring':
       year = year-1
 
@@ -46,7 +121,13 @@ class WxGrabber(object):
               'city'   : identifier,
               'day'    : day}
 
-    soup = self._getHTML( self._RESULTS, params = params ) 
+    if self._parser == 'lxml':                                                  # If using lxml parser
+      html = self._getContent( self._RESULTS, final = final, params = params )
+      if html is None: return None
+      return WxResultsLXML( html, identifier )
+
+    soup  = self._getHTML( self._RESULTS, final = final, params = params ) 
+    if soup is None: return None
 
     return WxResults( soup, identifier )
 
@@ -88,8 +169,10 @@ class WxGrabber(object):
       sYear = eYear - 1                                                         # Set sYear to year before eYear
 
     params = {'year' : self._getYear(sYear, eYear)}                             # Set parameters for php request
+    final  = datetime.datetime(eYear, 7, 1) <= ref                              # Schedule does not change once the season is over
 
-    soup = self._getHTML( self._SCHEDULE, params=params ) 
+    soup = self._getHTML( self._SCHEDULE, final=final, params=params ) 
+    if soup is None: return None
     return WxSeason( soup )                                                     # Try to get request
 
   def _getYear(self, sYear, eYear):
@@ -99,29 +182,75 @@ class WxGrabber(object):
     eYear = str(eYear)[-2:]                                                     # Get last 2 digits of eYear
     return '{}-{}'.format(sYear, eYear)                                         # Return formatted year
 
-  def _getHTML(self, url, **kwargs):
+  def _isFinal(self, semester, year, identifier):
+    """
+    Check if results for a forecast city can no longer change
+
+    Used to decide if cached results pages expire. Without a forecast
+    schedule nothing is known about the city, so always returns False;
+    sub-classes that hold the schedule should override.
+
     """
-    Actually get the html data from the URL and parse with BeautifulSoup
+
+    return False
+
+  def _getContent(self, url, final = False, **kwargs):
+    """
+    Get the raw content from the URL, or from the cache if enabled
+
+    Connection errors, timeouts and server (5xx) errors are retried with
+    exponential backoff before giving up.
 
     Arguments:
       url (str) : URL to use in request
 
     Keyword arguments:
+      final (bool) : Set if the page can no longer change; cached copy of the
+        page never expires
       Any accepted by requests.post()
 
     Returns:
-      BeautifulSoup parsed data
+      bytes : Content of the page
 
     """
 
+    params = kwargs.get('params', kwargs.get('data', None))                     # Parameters for request; used in cache key
+    if self._cache is not None:                                                 # If caching is enabled
+      html = self._cache.get( url, params, final = final or self._offline )     # Try to get page from cache; offline, any cached copy is used whatever its age
+      if html is not None:
+        self.__log.debug( f'Using cached page : {url}; using data : {params}' )
+        return html
+      if self._offline:                                                         # If offline, nothing more to do
+        self.__log.warning( f'Page not in cache while offline : {url}; using data : {params}' )
+        return None
+
     kwargs['verify'] = self._verify                                             # Set verify based on class attribute
+    kwargs.setdefault( 'timeout', self._timeout )                               # Set timeout if not already set
 
     self.__log.debug( f'Attempting to dowload : {url}; using data : {kwargs}' )
-    try:
-      r = requests.post( url, **kwargs )                                        # Try to get request
-    except Exception as err:                                                    # On exception
-      self.__log.error( err )                                                     # Log error
-      return None                                                               # Return None
+    for attempt in range( self._retries + 1 ):                                  # Iterate over all attempts
+      if attempt > 0:                                                           # If this is a retry
+        delay = self._backoff * 2**(attempt-1)                                  # Exponential backoff
+        delay = delay + random.uniform(0, delay)                                # Add jitter so retries do not all hit the server at once
+        self.__log.info( f'Retry {attempt} of {self._retries} in {delay:.2f}s : {url}' )
+        time.sleep( delay )
+
+      try:
+        r = self._session.post( url, **kwargs )                                 # Try to get request
+      except (requests.ConnectionError, requests.Timeout) as err:               # On connection exception
+        self.__log.warning( err )                                               # Log warning
+        continue                                                                # Try again
+      except Exception as err:                                                  # On any other exception
+        self.__log.error( err )                                                 # Log error
+        return None                                                             # Return None
+
+      if r.status_code >= 500:                                                  # If server error
+        self.__log.warning( f'Server error {r.status_code} : {url}' )
+        continue                                                                # Try again
+      break                                                                     # Break on any other response
+    else:                                                                       # If all attempts failed
+      self.__log.error( f'Failed to download after {self._retries+1} attempts : {url}; using data : {kwargs}' )
+      return None
 
     if not r.ok:                                                                # Check if request is Okay
       self.__log.error( 'Request is not okay' )                                   # Log error
@@ -134,8 +263,39 @@ class WxGrabber(object):
       return None                                                               # Return None
 
     self.__log.debug( html ) 
+    if self._cache is not None:                                                 # If caching is enabled
+      self._cache.put( url, params, html )                                      # Add page to cache
+    return html
+
+  def _getHTML(self, url, **kwargs):
+    """
+    Actually get the html data from the URL and parse with BeautifulSoup
+
+    Arguments:
+      url (str) : URL to use in request
+
+    Keyword arguments:
+      Any accepted by _getContent()
+
+    Returns:
+      BeautifulSoup parsed data
+
+    """
+
+    html = self._getContent( url, **kwargs )
+    if html is None: return None
     return BeautifulSoup(html, 'lxml')                                          # Parse the html data using the lxml format?
 
+  def close(self):
+    """Close the persistent HTTP session"""
+
+    self._session.close()
+
+
+_iName = [col['name'] for col in WxData.resultsCols].index('name')             # Index of name column in results table
+_iAbs  = [col['name'] for col in WxData.resultsCols].index('abs')              # Index of absences column in results table
+_toType = [{'INTEGER' : _toInteger, 'REAL' : _toReal}.get(col['type'], str) 
+            for col in WxData.resultsCols]                                      # Conversion from text to type of SQL column for each column in results table
 
 class WxResults( object ):
   #def __init__(self, year, school, city, day, soup):
@@ -168,13 +328,53 @@ class WxResults( object ):
     return '< {} - {}, {} : {} >'.format(
             self.__class__.__name__, self.city, self.state, self._verification )
 
+  ##############################################################################
+  # Methods for locating elements in the parsed page; these are the only
+  # methods that depend on the parser used
+  def _findHeader( self ):
+    """Text of the header containing verification; None if not found"""
+
+    tmp = self._soup.find('h5')
+    return tmp.text if tmp else None
+
+  def _findSelected( self ):
+    """Text of all selected options in results page"""
+
+    return [ele.text for ele in self._soup.find_all('option', selected=True)]
+
+  def _findTables( self ):
+    """All tables in results page"""
+
+    return self._soup.find_all('table')
+
+  def _findDate( self, table ):
+    """Text of first column of last row in table; None if not found"""
+
+    rows = table.find_all('tr')
+    if rows:
+      col = rows[-1].find('td')
+      if col: return col.text
+    return None
+
+  def _findRows( self, table ):
+    """Generator of column text for all rows in table"""
+
+    for row in table.find_all('tr'):                                            # Iterate over all rows; i.e., all <tr> elements
+      yield [ele.text for ele in row.find_all('td')]                            # Get text of all columns in the row; i.e., all <td> elements
+
+  def _findModelCols( self, table ):
+    """Text of columns that are direct children of table"""
+
+    return [ele.text for ele in table.find_all('td', recursive = False)]        # Find all columns in table non-recursively
+
+  ##############################################################################
   def _parseVerification( self ):
-    """Get verification data from the BeautifulSoup data"""
+    """Get verification data from the parsed results page"""
   
-    tmp = self._soup.find('h5')
+    tmp = self._findHeader()
     if tmp:
-      self._verification = tmp.text 
-      tmp = tmp.text.split(':')[1].split('/')
+      self._verification = tmp 
+      tmp = tmp.split(':')[1].split('/')
       self.max    = getTemp(tmp[0])
       self.min    = getTemp(tmp[1])
       self.wind   = getWind(tmp[2])
@@ -182,76 +382,58 @@ class WxResults( object ):
 
   def _parseSelected( self ):
     """Get selected options in results page"""
-    tmp = self._soup.find_all('option', selected=True)
+    tmp = self._findSelected()
     if tmp is not None:
-      self.year   = tmp[0].text
-      self.school = tmp[1].text.strip()
-      city, state = splitCityState( tmp[2].text )
-      self.day    = tmp[3].text
+      self.year   = tmp[0]
+      self.school = tmp[1].strip()
+      city, state = splitCityState( tmp[2] )
+      self.day    = tmp[3]
 
       self.city, self.state = city, state
 
   def _parseDate(self):
 
-    tables = self._soup.find_all('table')
+    tables = self._findTables()
     if tables and len(tables) == 2:
-      table = tables[1]
-      rows  = table.find_all('tr')
-      if rows:
-        col = rows[-1].find('td')
-        if col:
-          ref  = datetime.datetime.strptime(col.text, '%Y%m%d')
-          self.date = ref.date()
-          return
+      col = self._findDate( tables[1] )
+      if col:
+        ref  = datetime.datetime.strptime(col, '%Y%m%d')
+        self.date = ref.date()
+        return
 
     self.__log.error('Failed to parse date from results page!')
 
   def _forecastTag( self, fc ):
     """Generate dictionary key based on forecast metadata"""
-    return '{}:{}:{}'.format( fc['name'], fc['school'], fc['category'] )        # Initialize a tag for the __forecasters dictionary
+    return '{}:{}:{}'.format( fc.name, fc.school, fc.category )                 # Initialize a tag for the __forecasters dictionary
 
   def _parseColumns( self, cols ):
     """
     Parse data from columns in table row
 
     All forecast information for columns in a given row are parsed into
-    a dictionary
+    a ForecastRow with values in the same order as the columns of the SQL
+    forecasts table
 
     Arguments:
-      cols (bs4.element.ResultSet, list) : Column information
+      cols (list) : Text of each column
 
     Keyword argumnets:
       None.
 
     Returns:
-      dict : Forecast data parsed to dictionary
+      ForecastRow : Forecast data parsed to named tuple
 
     """
 
-    cols = [ele.text.strip() for ele in cols]                                   # Get text for each column in the row
+    cols = [ele.strip() for ele in cols]                                        # Strip text for each column in the row
     cols = [ele for ele in cols if ele != '|']
     if len(cols) != len(WxData.resultsCols): return None
-    fc   = {}                                                                   # Initialize data to empty list
-    for i in range( len(cols) ):                                                # Iterate over all elements in the column data
-      cName = WxData.resultsCols[i]['name']                                     # Column name
-      if cName == 'name':
-        ele = cols[i]
-      elif cols[i].isdigit():                                                     # If the element is a digit
-        ele = int(cols[i])                                                      # Set x to integer type of element
-      else:                                                                     # Else
-        try:                                                                    # Try to...
-          ele = float(cols[i])                                                  # Convert element to float
-        except:                                                                 # If convert to float fails
-          ele = cols[i]                                                         # Keep as string
-      if cName == 'abs' and ele == '': ele = 0 
-      self.__log.log( 5, f'Adding info to forecast - {cName} : {ele}' )
-      fc[ cName ] = ele 
-    fc['date']       = self.date
-    fc['identifier'] = self.identifier
-    fc['day']        = self.day
-    fc['semester']   = getSemester(self.date)
-    fc['year']       = self.date.year
-
+    vals = [_toNumber(ele) for ele in cols]                                     # Convert all columns to numbers where possible
+    vals[_iName] = cols[_iName]                                                 # Name is always string
+    if vals[_iAbs] == '': vals[_iAbs] = 0 
+    fc   = ForecastRow( *vals, *self._meta )                                    # Add date, identifier, day, semester, year
+    self.__log.log( 5, 'Parsed forecast : %s', fc )
     return fc
 
   def _parseForecasts( self, table, school = None ):
@@ -259,24 +441,23 @@ class WxResults( object ):
     Parse forecasts from table
 
     Arguments:
-      table (bs4.element.Tag) : Table object from BeautifulSoup
+      table : Table element from the parsed page
 
     Keyword arguments:
-      school (str) : 3-character code to filter by
+      school (str, list) : 3-character code(s) to filter by
 
     Returns:
-      (dict) : Model forecast information
+      (dict) : Forecast information; ForecastRow under tag
 
     """
 
+    if isinstance(school, str): school = [school]
     forecasts = {}
-    rows  = table.find_all('tr')                                                # Get all rows of the table, i.e., all <tr> elements
-    for row in rows:                                                            # Iterate over all rows
-      cols = row.find_all('td')                                                 # Get all columns in the row; i.e., all <td> elements
+    for cols in self._findRows( table ):                                        # Iterate over all rows
       fc   = self._parseColumns( cols )                                         # Parse columns
       if fc is None: continue                                                   # If failed to parse columns, continue
       if school is not None:                                                    # If the school keyword is set
-        if (fc['school'] != school):
+        if (fc.school not in school):
           continue
 
       tag = self._forecastTag( fc )                                             # Generate tag for forecast
@@ -293,17 +474,17 @@ class WxResults( object ):
     so must parse individual columns from table.
 
     Arguments:
-      table (bs4.element.Tag) : Table object from BeautifulSoup
+      table : Table element from the parsed page
 
     Keyword arguments:
       ncol (int) : Number of columns in table
 
     Returns:
-      (dict) : Model forecast information
+      (dict) : Model forecast information; ForecastRow under tag
 
     """
 
-    td = table.find_all('td', recursive = False)                                # Find all columns in table non-recursively
+    td = self._findModelCols( table )                                           # Find all columns in table non-recursively
     forecasts = {}                                                              # Initialize forecasts dictionary
 
     for i in range(0, len(td), ncol):                                           # Iterate over rows (skip ncol so that get all columns in a row)
@@ -315,15 +496,117 @@ class WxResults( object ):
 
     return forecasts                                                            # Return forecasts dictionary
 
-  def results(self, school = None):
+  def results(self, school = None, columnar = False):
+    """
+    Parse forecasts from the results page
+
+    Arguments:
+      None.
+
+    Keyword arguments:
+      school (str, list) : 3-character code(s) of schools to return
+        forecasts for. Model forecasts are always returned.
+      columnar (bool) : If set, return list of ForecastRow named tuples
+        with values in SQL forecasts table column order, which can be
+        passed straight to add_forecasts, instead of dictionary of
+        dictionaries
+
+    Returns:
+      (dict, list) : Forecast information
+
+    """
+
     if self.date is None: return None
 
-    table = self._soup.find('table')
-    if table is None: return None
+    tables = self._findTables()
+    if not tables: return None
+    table  = tables[0]
 
+    self._meta = (self.date, self.identifier, self.day, 
+                  getSemester(self.date), self.date.year)                       # Values of columns that are same for all forecasts on page
     forecasts = self._parseForecasts( table, school = school )                  # Initialize forecasts
     forecasts.update( self._parseModels( table ) )
 
+    if columnar:
+      return list( forecasts.values() )
+    return {tag : fc._asdict() for tag, fc in forecasts.items()}
+
+
+class WxResultsLXML( WxResults ):
+  """
+  Results page parsed directly with lxml
+
+  Drop-in replacement for WxResults that builds an lxml tree from the raw
+  HTML, skipping the BeautifulSoup tree entirely. Only the results table
+  and the tables after it are searched, and the text of each row is
+  converted straight to the types of the SQL forecasts table columns in a
+  single pass over the table.
+  """
+
+  def __init__(self, html, identifier):
+    self._tables = None
+    if isinstance(html, bytes):
+      try:
+        html = html.decode('utf-8')                                             # Without a charset in page, lxml assumes latin-1; BeautifulSoup detects UTF-8
+      except UnicodeDecodeError:
+        pass                                                                    # Leave lxml to use charset of page
+    super().__init__( lxmlHTML.document_fromstring( html ), identifier )
+
+  def _findHeader( self ):
+    tmp = self._soup.xpath('(//h5)[1]')
+    return tmp[0].text_content() if tmp else None
+
+  def _findSelected( self ):
+    return [ele.text_content() for ele in self._soup.xpath('//option[@selected]')]
+
+  def _findTables( self ):
+    """Results table and all tables after it; rows of results table are not searched"""
+
+    if self._tables is None:
+      table = self._soup.find('.//table')                                       # First table in page; search stops at it
+      self._tables = [] if table is None else [table] + table.xpath('following::table')
+    return self._tables
+
+  def _findDate( self, table ):
+    rows = table.xpath('.//tr')
+    if rows:
+      col = rows[-1].xpath('(.//td)[1]')
+      if col: return col[0].text_content()
+    return None
+
+  def _parseRow( self, cols ):
+    """
+    Parse text of columns in table row to ForecastRow
+
+    Each column is converted to the type of its SQL column, so there is
+    no guessing of types as in _parseColumns
+
+    """
+
+    cols = [ele.strip() for ele in cols]
+    cols = [ele for ele in cols if ele != '|']
+    if len(cols) != len(_toType): return None
+    vals = [conv(ele) for conv, ele in zip(_toType, cols)]
+    if vals[_iAbs] == '': vals[_iAbs] = 0 
+    return ForecastRow( *vals, *self._meta )
+
+  def _parseForecasts( self, table, school = None ):
+    if isinstance(school, str): school = [school]
+    forecasts = {}
+    for row in table.iter('tr'):                                                # Iterate over all rows in results table
+      fc = self._parseRow( [ele.text_content() for ele in row.iter('td')] )
+      if fc is None: continue
+      if (school is not None) and (fc.school not in school): continue
+      forecasts[ self._forecastTag( fc ) ] = fc
+    return forecasts
+
+  def _parseModels( self, table, ncol = 27 ):
+    td = [ele.text_content() for ele in table.iterchildren('td')]               # Columns that are direct children of table
+    forecasts = {}
+    for i in range(0, len(td), ncol):
+      fc = self._parseRow( td[i:i+ncol] )
+      if fc is None: continue
+      forecasts[ self._forecastTag( fc ) ] = fc
     return forecasts
 
 
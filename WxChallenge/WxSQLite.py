@@ -1,10 +1,17 @@
 import logging
 import sqlite3, os
+import threading
+import datetime
+from datetime import timedelta
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 
-from pandas import DataFrame
+import pandas
+from pandas import DataFrame, Timestamp
+from pandas.api.types import union_categoricals
 
 from . import data as WxData
-from .WxForecast import Forecaster, Forecasts
+from .WxForecast import Forecaster, Forecasts, get_School_Norm, grades_from_state
 from .WxGrabber import WxGrabber
 from .WxSchedule import WxSchedule
 
@@ -12,9 +19,100 @@ from .WxSchedule import WxSchedule
 _dir = os.path.dirname(os.path.abspath(__file__));
 _sql_file = os.path.join(_dir, 'WxChall.sql');
 
+def _typedFrame( rows, cols ):
+  """
+  Convert rows from the forecasts table to DataFrame with compact dtypes
+
+  TEXT columns are stored as categoricals, INTEGER columns are downcast to
+  the smallest integer type that holds them, and DATE columns are stored
+  as datetime64. Columns that do not convert cleanly are left as is.
+
+  """
+
+  types = {ele['name'] : ele['type'] for ele in WxData.forecastCols}
+  data  = DataFrame.from_records( rows, columns = cols )
+  for col in cols:
+    if types[col] == 'TEXT':
+      data[col] = data[col].astype( 'category' )
+    elif types[col] == 'DATE':
+      data[col] = pandas.to_datetime( data[col] )
+    elif types[col] == 'INTEGER':
+      try:
+        data[col] = pandas.to_numeric( data[col], downcast = 'integer' )
+      except (ValueError, TypeError):
+        pass
+  return data
+
+def _concatTyped( frames, cols ):
+  """Concatenate DataFrames from _typedFrame, merging categories of categoricals"""
+
+  if len(frames) == 0: return DataFrame( columns = cols )
+  data = {}
+  for col in cols:
+    parts = [frame[col] for frame in frames]
+    if all( [isinstance(part.dtype, pandas.CategoricalDtype) for part in parts] ):
+      data[col] = union_categoricals( parts, sort_categories = True )
+    else:
+      data[col] = pandas.concat( parts, ignore_index = True )
+  return DataFrame( data, columns = cols )
+
+def _toDate( date ):
+  """Convert date-like value (e.g., numpy.datetime64) to datetime.date for SQL"""
+
+  if type(date) is datetime.date: return date
+  return Timestamp( date ).date()
+
 class WxSQLite( WxGrabber ):
+  _FORECASTER_CMD = "SELECT * FROM forecasts WHERE (name=? AND school=? AND category=?)"
+  _VERIFY_CMD     = "SELECT * FROM verifications WHERE date IN (?) ORDER BY rowid"
+  _IN_CHUNK       = 500                                                         # Maximum number of values in an SQL IN (...) list
+  _SCHEDULE_WORKERS = 8                                                         # Number of seasons to download concurrently
+  _COMPLETE_CMD   = ('SELECT DISTINCT f.identifier, f.day, f.school FROM forecasts f '
+                     'JOIN verifications v ON (v.ident=f.identifier AND v.date=f.date) '
+                     'WHERE (f.semester=? AND f.year=?)')
+  _GRADE_STATE_CMD = (                                                          # Grade state for all forecasters at a forecast city
+    "INSERT INTO grade_state ({}) "
+    "WITH f AS ("
+    " SELECT name, school, category, year, semester, identifier, abs, day, date, type,"
+    " err_total, cum_err_total, norm_city,"                                    # Only columns used; copying all of them doubles the cost
+    " abs - COALESCE(LAG(abs) OVER w, 0) AS miss,"
+    " (LEAD(day) OVER w IS NULL) AS rn"                                        # Last forecast; same window as LAG so only one sort
+    " FROM forecasts WHERE (identifier=? AND semester=? AND year=?)"
+    " WINDOW w AS (PARTITION BY name, school, category ORDER BY day)"
+    "), c AS ("
+    " SELECT day, err_total, norm_city FROM f WHERE (name='CLIMO_') GROUP BY day"
+    ") "
+    "SELECT f.name, f.school, f.category, f.year, f.semester, f.identifier,"
+    " COUNT(*), MAX(f.abs), MIN(f.day), MIN(f.date), SUM(1 << (f.day-1)),"
+    " SUM(CASE WHEN f.miss != 0 THEN 1 << (f.day-1) ELSE 0 END),"
+    " SUM(CASE WHEN (f.miss = 0 AND c.err_total < f.err_total AND c.norm_city/10.0 > 3.0)"
+    "  THEN 1 << (f.day-1) ELSE 0 END),"
+    " (SELECT COUNT(*) FROM f WHERE (name='CLIMO_')), MAX(f.day),"
+    " MAX(CASE WHEN f.rn = 1 THEN (f.type IS NOT '') END),"
+    " MAX(CASE WHEN f.rn = 1 THEN f.cum_err_total END),"
+    " MAX(CASE WHEN f.rn = 1 THEN f.norm_city END) "
+    "FROM f LEFT JOIN c ON (c.day = f.day) GROUP BY f.name, f.school, f.category"
+  ).format( ','.join( [c['name'] for c in WxData.gradeStateCols] ) )
+
   ##############################################################################
-  def __init__(self, *args, file = _sql_file, full = False, verbose = False, **kwargs):
+  def __init__(self, *args, file = _sql_file, full = False, verbose = False, pragmas = None,
+               background = False, **kwargs):
+    """
+    Arguments:
+      None.
+
+    Keyword arguments:
+      file    (str)  : Path to the SQL database file
+      full    (bool) : Set to download the full forecast schedule when the
+        schedule is first used
+      background (bool) : Start downloading the schedule in a background
+        thread right away, rather than on first use
+      verbose (bool) : Increase verbosity
+      pragmas (dict) : SQLite pragmas to set on the database; these are
+        applied on top of the defaults in data.sqlPragmas
+
+    """
+
     super().__init__(*args, **kwargs)
 
     self.__log     = logging.getLogger( __name__ )
@@ -22,57 +120,140 @@ class WxSQLite( WxGrabber ):
     self.sqlFile = file
     self.db      = sqlite3.connect( self.sqlFile, detect_types=sqlite3.PARSE_DECLTYPES )
     self.cursor  = self.db.cursor()
+    self._depth  = 0                                                            # Depth of nested transaction() blocks
+    self.__dirty = set()                                                        # Forecast cities with grade state to refresh
+    self.__setPragmas( pragmas )
     self.__createTables()
 
-    self._schedule = WxSchedule()
-    self.sql_Load_Schedule()
+    self.__schedule = None                                                      # Schedule is loaded on first access; see _schedule
+    self.__full     = full
+    self.__refresh  = None                                                      # Future of background schedule refresh
+    self.__thread   = threading.get_ident()                                     # Thread that owns the database connection
+    if background:
+      self.sync_schedule( full = full, background = True )
+
+  @property
+  def _schedule(self):
+    """
+    The forecast schedule
 
-    if (len(self._schedule) == 0):
+    Loaded from the database, and downloaded if missing or out of date,
+    on first access; see sync_schedule. Results of a background refresh
+    are applied on the next access from the thread that owns the database.
+
+    """
+
+    if self.__schedule is None:
+      self.sync_schedule( full = self.__full )
+    elif (self.__refresh is not None and self.__refresh.done() and
+          threading.get_ident() == self.__thread):
+      self.__applyRefresh()
+    return self.__schedule
+
+  def sync_schedule(self, full = False, background = False):
+    """
+    Load the forecast schedule and download it if missing or out of date
+
+    Arguments:
+      None.
+
+    Keyword arguments:
+      full (bool) : Download schedules for all seasons
+      background (bool) : Download in a background thread. The schedule from
+        the database is available immediately and the downloaded schedule
+        is applied on a later access.
+
+    Returns:
+      WxSchedule : The schedule
+
+    """
+
+    sched = self.__loadSchedule()
+    if (len(sched) == 0):
       self.__log.debug('No schedule found in database, downloading')
-      self.download_Schedule(full=True)
+      kwargs = {'full' : True}
     elif full:
       self.__log.debug('Full schedule update...')
-      self.download_Schedule(full=True)
-    elif self._schedule.date > self._schedule.latest:                                      # If the current _date is greater than the latest date in the schedule
+      kwargs = {'full' : True}
+    elif sched.date > sched.latest:                                             # If the current _date is greater than the latest date in the schedule
       self.__log.debug('Schedule is old, updating...')
-      self.download_Schedule( year = self._schedule.date.year )                         # Update the schedule
+      kwargs = {'year' : sched.date.year}
     else:
       self.__log.debug('Schedule is current, nothing to do')
-    self.__log.debug( self._schedule.date > self._schedule.latest )                                      # If the current _date is greater than the latest date in the schedule
+      return sched
+
+    if background:
+      if self.__refresh is None:                                                # If no refresh already running
+        pool = ThreadPoolExecutor( max_workers = 1 )
+        self.__refresh = pool.submit( self._fetchSchedules, **kwargs )
+        pool.shutdown( wait = False )
+    else:
+      self.download_Schedule( **kwargs )
+    return sched
+
+  def __applyRefresh(self):
+    """Apply schedule from a background refresh"""
+
+    future, self.__refresh = self.__refresh, None
+    try:
+      seasons = future.result()
+    except Exception as err:
+      self.__log.error( 'Background schedule refresh failed: {}'.format(err) )
+    else:
+      self._applySchedules( seasons )
+
+  def __loadSchedule(self):
+    """Load the schedule from the database if not already loaded"""
+
+    if self.__schedule is None:
+      self.__schedule = WxSchedule()
+      self.sql_Load_Schedule()
+    return self.__schedule
+
+  def _isFinal(self, semester, year, identifier):
+    """Check if results for a forecast city can no longer change"""
+
+    tag  = '{}:{}'.format(semester.lower(), year)
+    info = self._schedule.get( tag, {} ).get( identifier.upper(), None )
+    if info is None: return False
+    return info['end'] + timedelta(days = WxData.final_days) < self._schedule.date
 
   def add_verification( self, wxResult ):
-    fcst_vars = [ ele['name'] for ele in WxData.verifyCols     ]                # List of variable names for all columns in the SQL forecasts table
-    chck_vars = [ ele         for ele in WxData.verifyChckCols ]                # List of variable names for checking if a forecast exists
-    whr       = self.__buildWhere( chck_vars )                                  # Build a 'WHERE (var1=? AND var2=?...)' statement based on the variables in the forecast check list
-    ins       = self.__buildInsert( fcst_vars )                                 # Build a '() VALUES ()' statement based on the columns in the forecast table
-    whr_cmd   = 'SELECT * from verifications {}'.format( whr )                  # Build full command to look for entry
-    ins_cmd   = 'INSERT INTO verifications {}'.format(   ins )                  # Build full command to insert data
-
-    chck_vals = [ wxResult.city, wxResult.state, wxResult.identifier, wxResult.date] # Get value to go in each column from the info dictionary
-    fcst_vals = [ wxResult.max,  wxResult.min,   wxResult.wind,       wxResult.precip] # Get value to go in each column from the info dictionary
-    fcst_vals = chck_vals + fcst_vals
-    self.cursor.execute( whr_cmd, chck_vals );                                  # Execute the command
-    fcst = self.cursor.fetchone();                                              # Attempt to get the forecast matching the conditions
-    if not fcst:                                                                # If there is nothing found, then
-      self.cursor.execute( ins_cmd, fcst_vals );                                # Execute the command
-    else:                                                                       # Else, must check the values in the table 
-      upd_var, upd_val = [], [];                                                # Lists to store key/value pairs for data that must be updated in the SQL forecasts table
-      for i in range( len(fcst) ):                                              # Iterate over all the forecast values
-        if fcst[i] != fcst_vals[i]:                                             # If the value from the SQL table does NOT match the current forecast value
-          upd_var.append( fcst_vars[i] );                                       # Append the variable name to the upd_var list
-          upd_val.append( fcst_vals[i] );                                       # Append the value to the upd_var list
-      if len(upd_var) > 0:                                                      # If there are values to update
-        upd = self.__buildUpdate( upd_var );                                    # Build a 'SET key=?, key=?' statement  based on the columns in 
-        upd_cmd = 'UPDATE verifications {} {}'.format( upd, whr );              # Build the update command
-        self.cursor.execute( upd_cmd, upd_val + chck_vals );                    # Update the values
-    self.db.commit();                                                           # Write all changes to the database  
+    """
+    Add verification from results page to database
+
+    Arguments:
+      wxResult (WxResults) : Parsed results page
+
+    Keyword arguments:
+      None.
+
+    Returns:
+      None.
+
+    """
+
+    fcst_vars = [ ele['name'] for ele in WxData.verifyCols     ]                # List of variable names for all columns in the SQL verifications table
+    chck_vars = [ ele         for ele in WxData.verifyChckCols ]                # List of variable names for checking if a verification exists
+    cmd       = self.__buildUpsert( 'verifications', fcst_vars, chck_vars )     # Build command to insert, or update existing, verification
+
+    fcst_vals = [ wxResult.city, wxResult.state, wxResult.identifier, wxResult.date,
+                  wxResult.max,  wxResult.min,   wxResult.wind,       wxResult.precip] # Get value to go in each column from the results
+    self.cursor.execute( cmd, fcst_vals );                                      # Execute the command
+    self._commit();                                                             # Write all changes to the database  
 
   def add_forecasts(self, forecasts):
     """
     Add forecast results to database
 
+    All forecasts are written with a single INSERT ... ON CONFLICT DO UPDATE
+    statement, executed for every forecast, in one transaction.
+
     Arguments:
-      forecasts (dict) : Forecasts to add to database
+      forecasts (dict, list) : Forecasts to add to database; either
+        dictionary of dictionaries keyed by column name, or list of
+        rows with values in forecasts table column order (e.g., from
+        WxResults.results with columnar set)
 
     Keyword arguments:
       None.
@@ -88,33 +269,71 @@ class WxSQLite( WxGrabber ):
 
     fcst_vars = [ ele['name'] for ele in WxData.forecastCols ]                  # List of variable names for all columns in the SQL forecasts table
     chck_vars = [ ele         for ele in WxData.fcstChckCols ]                  # List of variable names for checking if a forecast exists
-    whr       = self.__buildWhere( chck_vars )                                  # Build a 'WHERE (var1=? AND var2=?...)' statement based on the variables in the forecast check list
-    ins       = self.__buildInsert( fcst_vars )                                 # Build a '() VALUES ()' statement based on the columns in the forecast table
-    whr_cmd   = 'SELECT * from forecasts {}'.format( whr )                      # Build full command to look for entry
-    ins_cmd   = 'INSERT INTO forecasts {}'.format(   ins )                      # Build full command to insert data
-    
-    for tag in forecasts:                                                       # Iterate over all the forecasts
-      chck_vals = [ forecasts[tag][v] for v in chck_vars ];                     # Get value to go in each column from the info dictionary
-      fcst_vals = [ forecasts[tag][v] for v in fcst_vars ];                     # Get value to go in each column from the info dictionary
-      self.cursor.execute( whr_cmd, chck_vals );                                # Execute the command
-      fcst = self.cursor.fetchone();                                            # Attempt to get the forecast matching the conditions
-      if not fcst:                                                              # If there is nothing found, then
-        self.cursor.execute( ins_cmd, fcst_vals );                              # Execute the command
-      else:                                                                     # Else, must check the values in the table 
-        upd_var, upd_val = [], [];                                              # Lists to store key/value pairs for data that must be updated in the SQL forecasts table
-        for i in range( len(fcst) ):                                            # Iterate over all the forecast values
-          if fcst[i] != fcst_vals[i]:                                           # If the value from the SQL table does NOT match the current forecast value
-            upd_var.append( fcst_vars[i] );                                     # Append the variable name to the upd_var list
-            upd_val.append( fcst_vals[i] );                                     # Append the value to the upd_var list
-        if len(upd_var) > 0:                                                    # If there are values to update
-          upd = self.__buildUpdate( upd_var );                                  # Build a 'SET key=?, key=?' statement  based on the columns in 
-          upd_cmd = 'UPDATE forecasts {} {}'.format( upd, whr );                # Build the update command
-          self.cursor.execute( upd_cmd, upd_val + chck_vals );                  # Update the values
-    self.db.commit();                                                           # Write all changes to the database  
-
-  def get_forecasts(self, name = None, school = None, category = None, semester = None, year = None, models = False):
+    cmd       = self.__buildUpsert( 'forecasts', fcst_vars, chck_vars )         # Build command to insert, or update existing, forecasts
+
+    if isinstance(forecasts, dict):                                             # If dictionary of dictionaries
+      forecasts = [ [fc[v] for v in fcst_vars] for fc in forecasts.values() ]  # Convert to rows
+
+    self.cursor.executemany( cmd, forecasts );                                  # Insert/update all forecasts
+    city = [ fcst_vars.index(v) for v in ('identifier', 'semester', 'year') ]
+    self.__dirty.update( tuple( fc[i] for i in city ) for fc in forecasts )     # Grade state of cities must be refreshed
+    self._commit();                                                             # Write all changes to the database  
+
+  def get_forecasts(self, name = None, school = None, category = None, semester = None, year = None, models = False,
+                    typed = False, chunksize = 50000, columns = None, **kwargs):
     '''
     Method for getting forecasts from the database
+    Keywords:
+      typed     : If set, rows are read in chunks and converted to compact
+                   columns as they are read: categoricals for text columns,
+                   narrow integers, and datetime64 for dates. Default is
+                   to read all rows at once with object dtypes.
+      chunksize : Number of rows to read at a time when typed is set
+      columns   : List of columns to load; the columns used as the index
+                   of the Forecasts object are always loaded. Default is
+                   to load all columns.
+      See _forecastsQuery for all others
+
+    '''
+
+    cmd, vals = self._forecastsQuery( name = name, school = school, category = category,
+                                      semester = semester, year = year, models = models, 
+                                      columns = columns, **kwargs )
+    self.__log.debug( 'SQL command: {}'.format( cmd  ) )
+    self.__log.debug( 'SQL values:  {}'.format( vals ) )
+    self.cursor.execute(cmd, vals);                                             # Execute the command
+    cols = self._forecastsColumns( columns )
+    indx = ['' for col in cols];
+    for i in WxData.forecastCols:
+      if i['pandas_ind']:
+        indx[ i['pandas_ind_num'] ] = i['name'];
+    indx = [ind for ind in indx if ind != ''];
+     
+    if typed:                                                                   # If typed, read data in chunks and convert
+      frames = []
+      while True:
+        rows = self.cursor.fetchmany( chunksize )
+        if len(rows) == 0: break
+        frames.append( _typedFrame( rows, cols ) )
+      data = _concatTyped( frames, cols )
+    else:
+      data = self.cursor.fetchall()
+    return Forecasts( data, columns = cols, index = indx );                     # Return a new forecasts object
+
+  def _forecastsColumns(self, columns = None):
+    '''
+    Method for getting the columns to load from the forecasts table;
+    requested columns plus all index columns in table order
+    '''
+
+    cols = [i['name'] for i in WxData.forecastCols];
+    if columns is None: return cols
+    return [i['name'] for i in WxData.forecastCols if i['pandas_ind'] or i['name'] in columns]
+
+  def _forecastsQuery(self, name = None, school = None, category = None, semester = None, year = None, models = False,
+                      columns = None, dates = None, days = None, max_category = None, exclude_models = False):
+    '''
+    Method for building the SQL command for getting forecasts
     Keywords:
       name     : Name of the forecaster; if only this used, all forecasts
                   for this forecaster returned.
@@ -125,6 +344,14 @@ class WxSQLite( WxGrabber ):
       semester : Subset data by given semester
       year     : Subset data by given year
       models   : Default to True: gets category 8, set to False to NOT get data
+      columns  : List of columns to select; see _forecastsColumns
+      dates    : (start, end) tuple of dates to get data between, inclusive;
+                  either can be None for open ended
+      days     : (first, last) tuple of forecast days to get data between, inclusive;
+                  either can be None for open ended
+      max_category : Get only categories up to, and including, this category;
+                  e.g., 8 to exclude consensus
+      exclude_models : If set, model forecasts (school 'xxx') are NOT returned
 
     '''
 
@@ -162,48 +389,119 @@ class WxSQLite( WxGrabber ):
       for y in year:                                                            # Iterate over all values in semYear
         vars.append('year');                                                    # Append 'year' string to vars list
         vals.append(y);                                                         # Append input year to vals list
-    
-    
-    if len(vars) == 0:                                                          # If the length of vars is zero
-      cmd = 'SELECT * FROM forecasts';                                          # Set the command to select all forecasts
+
+    extra = []                                                                  # Conditions other than equality
+    for var, rng, conv in [('date', dates, _toDate), ('day', days, int)]:       # Iterate over range conditions
+      if rng is None: continue
+      if rng[0] is not None:
+        extra.append( '{}>=?'.format(var) )
+        vals.append( conv(rng[0]) )
+      if rng[1] is not None:
+        extra.append( '{}<=?'.format(var) )
+        vals.append( conv(rng[1]) )
+    if max_category is not None:
+      extra.append( 'category<=?' )
+      vals.append( max_category )
+    if exclude_models and not models:
+      extra.append( 'school!=?' )
+      vals.append( 'xxx' )
+
+    sel = '*' if columns is None else ','.join( self._forecastsColumns( columns ) ) # Columns to select
+    if len(vars) == 0 and len(extra) == 0:                                      # If there are no conditions
+      cmd = 'SELECT {} FROM forecasts'.format( sel );                           # Set the command to select all forecasts
     else:                                                                       # Else,
-      whr = self.__buildWhere( vars );                                          # Use the private method to build a where statement for the command
-      cmd = 'SELECT * FROM forecasts {}'.format( whr );                         # Set command with where statment
-    self.__log.debug( 'SQL command: {}'.format( cmd  ) )
-    self.__log.debug( 'SQL values:  {}'.format( vals ) )
-    self.cursor.execute(cmd, vals);                                             # Execute the command
-    cols = [i['name'] for i in WxData.forecastCols];
-    indx = ['' for col in cols];
-    for i in WxData.forecastCols:
-      if i['pandas_ind']:
-        indx[ i['pandas_ind_num'] ] = i['name'];
-    indx = [ind for ind in indx if ind != ''];
-     
-    return Forecasts( self.cursor.fetchall(), columns = cols, index = indx );   # Return a new forecasts object
+      whr = self.__buildWhere( vars, extra );                                   # Use the private method to build a where statement for the command
+      cmd = 'SELECT {} FROM forecasts {}'.format( sel, whr );                   # Set command with where statment
+    return cmd, vals
 
-  def get_verification( self, dates = None):
-    tmp = {}
-    if isinstance(dates, (list, tuple)):
-      cmd = "SELECT * FROM verifications WHERE (date=?)"
-      for date in dates:
-        self.cursor.execute(cmd, (date,))
-        entry = self.cursor.fetchone()
-        if entry:
-          entry = list(entry)
-          key   = entry.pop(3)
-          tmp[key] = entry
+  def get_verification( self, dates = None, aligned = False ):
+    """
+    Get verification from the database
+
+    When dates are given, verification for all of them is selected with a
+    single query rather than one query per date. If there is more than one
+    verification for a date, the first stored is used when dates are
+    given, and the last when getting all verification.
+
+    Arguments:
+      None.
+
+    Keyword arguments:
+      dates (list, tuple, set) : Dates to get verification for; default is
+        to get all verification
+      aligned (bool) : If set, return DataFrame indexed by date, in the
+        order of the requested dates, with NaN for dates that have no
+        verification. Default is to return dictionary
+
+    Returns:
+      dict, DataFrame : If dictionary, keys are dates and values are lists
+        with verification for all other columns of the verifications table
+
+    """
+
+    cols = [ ele['name'] for ele in WxData.verifyCols ]                         # Columns of the verifications table
+    full = not isinstance(dates, (list, tuple, set))                            # If set, get all verification
+    if not full:
+      if isinstance(dates, set): dates = sorted( dates )
+      dates = [ _toDate(date) for date in dates ]
+      uniq  = list( dict.fromkeys( dates ) )                                    # Unique dates, keeping order
+      rows  = []
+      for i in range(0, len(uniq), self._IN_CHUNK):                             # Iterate over chunks of dates so as not to exceed SQLite variable limit
+        chunk = uniq[i:i+self._IN_CHUNK]
+        cmd   = 'SELECT * FROM verifications WHERE date IN ({}) ORDER BY rowid'.format(
+          ','.join( ['?'] * len(chunk) ) )
+        self.cursor.execute( cmd, chunk )
+        rows.extend( self.cursor.fetchall() )
     else:
-      cmd = "SELECT * FROM verifications"
-      self.cursor.execute(cmd)
-      entry = self.cursor.fetchall()
-      for e in entry:
-        e = list(e)
-        key = e.pop(3)
-        if key:
-          tmp[key] = e
+      self.cursor.execute( 'SELECT * FROM verifications ORDER BY rowid' )
+      rows  = self.cursor.fetchall()
+
+    iDate = cols.index('date')
+    if aligned:
+      data = DataFrame( rows, columns = cols )
+      data = data.loc[ data['date'].notna() ].drop_duplicates( 'date', keep = 'last' if full else 'first' )
+      data = data.set_index( 'date' )
+      if not full: data = data.reindex( dates )
+      return data
+
+    tmp = {}
+    for e in rows:
+      e   = list(e)
+      key = e.pop(iDate)
+      if key and (full or key not in tmp):                                      # Last verification for date if full, else first
+        tmp[key] = e
 
     return tmp
 
+  def get_complete(self, semester, year):
+    """
+    Get results pages that are already stored in the database
+
+    A page is taken to be stored if there are forecasts for the
+    identifier, day, and school, and verification for the identifier on
+    the date of the forecasts.
+
+    Arguments:
+      semester (str) : Semester to check
+      year     (int) : Year to check
+
+    Keyword arguments:
+      None.
+
+    Returns:
+      set : (identifier, day, school) tuples of stored pages. Pages for the
+        national results, which contain all schools, use school 'natl'
+
+    """
+
+    self.cursor.execute( self._COMPLETE_CMD, (semester.lower(), year,) )
+    complete = set()
+    for identifier, day, school in self.cursor.fetchall():
+      complete.add( (identifier, day, school,) )
+      if school != 'xxx':                                                       # Models are on every page, so do not count for national
+        complete.add( (identifier, day, 'natl',) )
+    return complete
+
   def get_forecaster(self, name, sch, cat):
     """
     Method to get unique key for given forecaster based on 
@@ -212,44 +510,132 @@ class WxSQLite( WxGrabber ):
 
     """
 
-    cmd = "SELECT * FROM forecasts WHERE (name=? AND school=? AND category=?)";
-    self.cursor.execute( cmd, (name, sch, cat,) );
+    self.cursor.execute( self._FORECASTER_CMD, (name, sch, cat,) );
     entry = self.cursor.fetchone();
     if entry:
       return entry[-1];
     else:
       return None;
 
-  def download_Schedule(self, year = None, full = False):
+  def explain(self, cmd, vals = ()):
+    """
+    Get the query plan for an SQL command
+
+    Arguments:
+      cmd (str) : SQL command
+
+    Keyword arguments:
+      vals (iter) : Values for the command
+
+    Returns:
+      list : Details of each step of the query plan
+
+    """
+
+    self.cursor.execute( 'EXPLAIN QUERY PLAN {}'.format(cmd), vals )
+    return [ row[-1] for row in self.cursor.fetchall() ]
+
+  def explain_queries(self, school = 'natl', semester = 'fall', year = 2020):
+    """
+    Get the query plans for the main queries
+
+    Useful for checking that the queries are using the indices rather
+    than scanning whole tables. Plans are also logged at debug level.
+
+    Arguments:
+      None.
+
+    Keyword arguments:
+      school   (str) : School code to use in queries
+      semester (str) : Semester to use in queries
+      year     (int) : Year to use in queries
+
+    Returns:
+      dict : Tuple of SQL command and list of query plan details under
+        name of each query
+
+    """
+
+    queries = {
+      'get_forecasts'  : self._forecastsQuery( school = school, semester = semester, year = year ),
+      'get_forecasts (models)' : self._forecastsQuery( semester = semester, year = year, models = True ),
+      'get_forecasts (name)'   : self._forecastsQuery( name = 'CONSEN' ),
+      'get_forecaster'   : (self._FORECASTER_CMD, ('CONSEN', school, 9,)),
+      'get_verification' : (self._VERIFY_CMD, (datetime.date(year, 10, 1),)),
+      'get_complete'     : (self._COMPLETE_CMD, (semester, year,)),
+    }
+    plans = {}
+    for key, (cmd, vals) in queries.items():
+      plans[key] = (cmd, self.explain( cmd, vals ),)
+      self.__log.debug( 'Query plan for {} : {}; {}'.format(key, cmd, plans[key][1]) )
+    return plans
+
+  def download_Schedule(self, year = None, full = False, workers = _SCHEDULE_WORKERS):
     """
     A method to get the current; or previous, forecase schedule.
     If year is used, assumed to be year of Fall semester, so will
     get schedule for year/year+1 season.
+
+    If full is set, schedules for all seasons since 2006 are downloaded,
+    skipping seasons that are over and already in the database.
     
     """
 
+    self._applySchedules( self._fetchSchedules( year = year, full = full, workers = workers ) )
+
+  def _fetchSchedules(self, year = None, full = False, workers = _SCHEDULE_WORKERS):
+    """
+    Download and parse forecast schedules
+
+    Only touches the network and the parser, so is safe to run in a
+    background thread. Seasons are downloaded concurrently using at most
+    workers threads. See download_Schedule for arguments.
+
+    Returns:
+      list : Parsed schedule for each season
+
+    """
+
+    sched   = self.__loadSchedule()
+    current = year is None or year == sched.date.year
     if full:
-      self._schedule.Clear();
-      year = [y for y in range(2006, self._schedule.date.year)]
-    
-    if (year == self._schedule.date.year) or (year is None) or full:                 # If year is None (i.e., no year input) OR all is True
-      season = self.getSchedule()                  # Set up url
-      if season:
-        self._schedule.Update( season.parse() );                                         # Parse the schedule
-      if not full:                                                               # If full is NOT set
-        self.sql_Update_Schedule( );
-        return;
+      year = [y for y in range(2006, sched.date.year) if not self.__hasSeason( sched, y )]
+      self.__log.debug( 'Seasons to backfill: {}'.format(year) )
+    elif current:                                                               # If year is None (i.e., no year input) or current year
+      year = []
     elif not isinstance(year, list):                                            # Else, if year is not list instance
       year = [year];                                                            # Convert year to list
 
-    for y in year:                                                              # Iterate over all years
-      #syear, eyear = str(y)[-2:], str(y+1)[-2:];
-      syear, eyear = y, y+1
-      self.__log.debug( 'syear: {}, eyear: {}'.format(syear, eyear) )
-      season = self.getSchedule(syear, eyear)
-      if season:
-        self._schedule.Update( season.parse() )                                         # Parse the schedule
-    self.sql_Update_Schedule( )
+    args = [(y, y+1,) for y in year]                                            # Start/end year of each season
+    if full or current:
+      args.append( () )                                                         # Current season; determined by getSchedule
+
+    def fetch( arg ):
+      self.__log.debug( 'Getting schedule for season: {}'.format(arg) )
+      season = self.getSchedule( *arg )
+      return season.parse() if season else None                                 # Parse the schedule
+
+    if len(args) < 2 or workers is None or workers < 2:
+      seasons = [fetch( arg ) for arg in args]
+    else:
+      with ThreadPoolExecutor( max_workers = workers ) as pool:
+        seasons = list( pool.map( fetch, args ) )
+    return [season for season in seasons if season]
+
+  def __hasSeason(self, sched, year):
+    """Check if season starting in year is over and in the schedule"""
+
+    if datetime.date(year+1, 7, 1) > sched.date:                                # Season may still change
+      return False
+    return ('fall:{}'.format(year) in sched) and ('spring:{}'.format(year+1) in sched)
+
+  def _applySchedules(self, seasons):
+    """Add parsed schedules to the schedule and the database"""
+
+    sched = self.__loadSchedule()
+    for season in seasons:
+      sched.Update( season )
+    self.sql_Update_Schedule()
 
   def sql_Load_Schedule(self):
     """Method to get full schedule"""
@@ -261,23 +647,168 @@ class WxSQLite( WxGrabber ):
         info = {}
         for col, val in zip(WxData.scheduleCols, city):
           info[col['name']] = val
-        self._schedule.Update( info )
+        self.__schedule.Update( info )
 
   def sql_Update_Schedule(self):
-    """Method to update the schedule in the database"""
-    for semYear in self._schedule:                                              # Iterate over the semester:year tags in schedDict
-      for ident in self._schedule[semYear]:                                     # Iterate over the identifier tags in schedDict[semYear]
-        info = self._schedule[semYear][ident];
-        vars = [ ele['name'] for ele in WxData.scheduleCols ];                  # Get list of names for each column in the schedule table
-        vals = [ info[ v ] for v in vars ];                                     # Get value to go in each column from the info dictionary
-        whr  = self.__buildWhere( vars );                                       # Build a 'WHERE (var1=? AND var2=?...)' statement based on the columns in the schedule table
-        cmd  = 'SELECT * FROM schedule {}'.format( whr );                       # Build full command to look for entry
-        self.cursor.execute( cmd, vals );                                       # Execute the command
-        if not self.cursor.fetchone():                                          # If there is nothing found, then
-          ins = self.__buildInsert( vars );
-          cmd = 'INSERT INTO schedule {}'.format( ins );
-          self.cursor.execute( cmd, vals );
-          self.db.commit();
+    """
+    Method to update the schedule in the database
+
+    All cities are written in a single statement; cities already in the
+    table are ignored based on the unique schedule index.
+
+    """
+
+    sched = self.__loadSchedule()
+    vars  = [ ele['name'] for ele in WxData.scheduleCols ];                     # Get list of names for each column in the schedule table
+    rows  = [ [ sched[semYear][ident][v] for v in vars ]                        # Get value to go in each column from the info dictionary
+              for semYear in sched for ident in sched[semYear] ]
+    cmd   = 'INSERT OR IGNORE INTO schedule {}'.format( self.__buildInsert( vars ) )
+    self.cursor.executemany( cmd, rows )
+    self._commit();
+
+  @contextmanager
+  def transaction(self):
+    """
+    Context manager for a batch transaction
+
+    All changes made by add_forecasts, add_verification, etc. inside the
+    block are committed once, when the outermost block exits, instead of
+    after every call. If an exception is raised, all changes are rolled
+    back.
+
+    Example:
+      with wx.transaction():
+        for res in results:
+          wx.add_forecasts( res.results() )
+          wx.add_verification( res )
+
+    """
+
+    self._depth += 1
+    try:
+      yield self
+    except:
+      self._depth -= 1
+      if self._depth == 0: 
+        self.db.rollback()
+        self.__dirty.clear()
+      raise
+    self._depth -= 1
+    self._commit()
+
+  def _commit(self):
+    """
+    Commit changes to the database, unless inside a transaction() block
+
+    Grade state of forecast cities with new forecasts is refreshed first,
+    so that it is committed with the forecasts.
+
+    """
+
+    if self._depth == 0: 
+      self.__refreshGradeState()
+      self.db.commit()
+
+  def __refreshGradeState(self):
+    """
+    Recompute grade state for forecast cities with new forecasts
+
+    This is a full recompute of each city, not an update of running
+    counts: a city has at most 8 forecast days, and a daily update adds
+    a day for every forecaster at the city, so the recompute reads at most
+    8 times the rows that were added. Recomputing also keeps the state
+    right when forecasts or CLIMO_ rows are updated or arrive out of order.
+
+    """
+
+    while self.__dirty:
+      identifier, semester, year = self.__dirty.pop()
+      vals = (identifier, semester, year,)
+      self.cursor.execute( 'DELETE FROM grade_state {}'.format(
+        self.__buildWhere( ['identifier', 'semester', 'year'] ) ), vals )
+      self.cursor.execute( self._GRADE_STATE_CMD, vals )
+
+  def refresh_grade_state(self, semester = None, year = None):
+    """
+    Rebuild grade state from the forecasts table
+
+    Grade state is kept up to date as forecasts are added, so this is only
+    needed for forecasts added before the grade state table existed.
+
+    Arguments:
+      None.
+
+    Keyword arguments:
+      semester (str) : Only rebuild for this semester
+      year (int)     : Only rebuild for this year
+
+    Returns:
+      None.
+
+    """
+
+    cmd, vars, vals = 'SELECT DISTINCT identifier, semester, year FROM forecasts', [], []
+    if semester is not None: vars.append( 'semester' ); vals.append( semester.lower() )
+    if year     is not None: vars.append( 'year'     ); vals.append( year )
+    if vars: cmd = '{} {}'.format( cmd, self.__buildWhere( vars ) )
+    self.cursor.execute( cmd, vals )
+    self.__dirty.update( self.cursor.fetchall() )
+    self._commit()
+
+  def get_grades(self, school = None, semester = None, year = None, vacation = None):
+    """
+    Get grades for forecasters from the grade state table
+
+    Grades are the same as computed by Forecasts.calc_grades, but are
+    computed from the summary of each forecaster at each forecast city
+    instead of from all forecasts.
+
+    Arguments:
+      None.
+
+    Keyword arguments:
+      school (str, list) : School code(s) to get grades for
+      semester (str)     : Semester to get grades for
+      year (int)         : Year to get grades for
+      vacation (list)    : List of tuples with start and end dates of any vacations
+
+    Returns:
+      DataFrame : Grades; as in Forecasts.grades
+
+    """
+
+    if not isinstance(school, (list, tuple,)): school = [] if school is None else [school]
+    vars, vals = [], []
+    if semester is not None: vars.append( 'semester' ); vals.append( semester.lower() )
+    if year     is not None: vars.append( 'year'     ); vals.append( year )
+
+    cmd = 'SELECT COUNT(*) FROM grade_state'
+    if vars: cmd = '{} {}'.format( cmd, self.__buildWhere( vars ) )
+    if self.cursor.execute( cmd, vals ).fetchone()[0] == 0:                     # If no state; i.e., data added before grade state existed
+      self.refresh_grade_state( semester, year )
+
+    cols  = [c['name'] for c in WxData.gradeStateCols]
+    cmd   = 'SELECT {} FROM grade_state {}'.format( ','.join(cols), 
+      self.__buildWhere( ['school'] * len(school) + vars, extra = ["school!='xxx'"] ) )
+    state = DataFrame( self.cursor.execute( cmd, school + vals ).fetchall(), columns = cols )
+
+    def school_norm( station ):                                                 # School consensus error from forecasts
+      sch, yr, sem, ident = station
+      fcData = self.get_forecasts( school = sch, semester = sem, year = int(yr), columns = WxData.gradeCols,
+                                   typed = True )
+      fcData = fcData.loc[ fcData.index.get_level_values('identifier') == ident ]
+      return get_School_Norm( fcData, self.get_verification( set(fcData.date.values), aligned = True ) )[0]
+
+    return grades_from_state( state, vacation = vacation, school_norm = school_norm )
+
+  def __setPragmas(self, pragmas = None):
+    """Method to apply SQLite pragmas to the database"""
+
+    settings = dict( WxData.sqlPragmas )
+    if pragmas is not None: settings.update( pragmas )
+    for key, val in settings.items():
+      self.cursor.execute( 'PRAGMA {}={}'.format(key, val) )
+      self.__log.debug( 'PRAGMA {} : {}'.format(key, self.cursor.fetchall()) )
 
   def __createTables(self):
     """Method to create tables if None exist in the file"""
@@ -285,11 +816,37 @@ class WxSQLite( WxGrabber ):
     table1 = 'forecasts ({})'.format(     ', '.join( buildCols(WxData.forecastCols) ) )
     table2 = 'schedule ({})'.format(      ', '.join( buildCols(WxData.scheduleCols) ) )
     table3 = 'verifications ({})'.format( ', '.join( buildCols(WxData.verifyCols) ) )
+    table4 = 'grade_state ({})'.format(   ', '.join( buildCols(WxData.gradeStateCols) ) )
     self.cursor.execute( "CREATE TABLE IF NOT EXISTS {}".format(table1) )
     self.cursor.execute( "CREATE TABLE IF NOT EXISTS {}".format(table2) )
     self.cursor.execute( "CREATE TABLE IF NOT EXISTS {}".format(table3) )
+    self.cursor.execute( "CREATE TABLE IF NOT EXISTS {}".format(table4) )
+    self.__createIndices()
     self.db.commit();
 
+  def __createIndices(self):
+    """
+    Method to create indices if they do not exist in the file
+
+    Databases created before the unique indices existed may contain
+    duplicate entries; these are removed, keeping the latest, so that
+    the index can be created.
+
+    """
+
+    for index in WxData.sqlIndices:
+      cols = ','.join( index['cols'] )
+      cmd  = 'CREATE {}INDEX IF NOT EXISTS {} ON {} ({})'.format(
+        'UNIQUE ' if index['unique'] else '', index['name'], index['table'], cols )
+      try:
+        self.cursor.execute( cmd )
+      except sqlite3.IntegrityError:
+        self.__log.warning( 'Removing duplicate entries from {} table'.format(index['table']) )
+        self.cursor.execute( 
+          'DELETE FROM {0} WHERE rowid NOT IN (SELECT MAX(rowid) FROM {0} GROUP BY {1})'.format(
+            index['table'], cols ) )
+        self.cursor.execute( cmd )
+
   def __check_city(self, city, state, ident, start, end):
     """
     Get unique key for given forecaster based on name, school, and category
@@ -308,8 +865,13 @@ class WxSQLite( WxGrabber ):
     else:
       return None;
 
-  def __buildWhere(self, cols):
-    """Build where function into the SQL table"""
+  def __buildWhere(self, cols, extra = None):
+    """
+    Build where function into the SQL table
+
+    Equality checks on cols, with repeated columns OR'ed together, are
+    AND'ed with any conditions in extra
+    """
 
     vars, i = [], 0;
     while i < len(cols):
@@ -321,16 +883,22 @@ class WxSQLite( WxGrabber ):
         tmp = ' OR '.join( tmp )
         vars.append( '({})'.format(tmp) );  
       i += n      
+    if extra: vars.extend( extra );
     return "WHERE ({})".format( ' AND '.join( vars ) );
   def __buildInsert(self, cols):
     vars = [ele for ele in cols];
     vals = ['?'] * len(vars)
     return "({}) VALUES ({})".format( ','.join( vars ), ','.join( vals ) );
-  def __buildUpdate(self, cols):
-    vars = ['{}=?'.format(ele) for ele in cols];
-    return "SET {}".format( ','.join( vars ) );
+  def __buildUpsert(self, table, cols, chck):
+    """Build INSERT statement that updates existing entry on conflict in chck columns"""
+
+    upd = ['{0}=excluded.{0}'.format(ele) for ele in cols if ele not in chck];
+    return "INSERT INTO {} {} ON CONFLICT({}) DO UPDATE SET {}".format(
+      table, self.__buildInsert( cols ), ','.join( chck ), ','.join( upd ) );
 
   ##############################################################################
   def close(self): 
+    self.cursor.execute( 'PRAGMA optimize' );                                   # Update statistics used by the query planner
     self.db.commit();
     self.db.close();
+    super().close()
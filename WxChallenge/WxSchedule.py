@@ -1,9 +1,12 @@
 import logging 
-from datetime import date
+from bisect import bisect_right
+from datetime import date, timedelta
+
+import numpy
 
 from .utils import generateKey#, updateSchedule;
 from .parsers import parse_schedule
-
+from .data import day_offsets
 
 class WxSchedule( dict ):
   def __init__(self):
@@ -11,6 +14,7 @@ class WxSchedule( dict ):
     self.date   = date.today()
     self.latest = None;                                                         # Initialize latest attribute to None
     self.log    = logging.getLogger( __name__ );
+    self._index = None;                                                         # Interval index of forecast cities; see index
 
   def Update(self, season):
     '''
@@ -42,6 +46,7 @@ class WxSchedule( dict ):
         self[key].update( season[key] )
       else:
         self[key] = season[key];
+    self._index = None;                                                         # Index must be rebuilt
 
   def Clear(self):
     '''
@@ -59,6 +64,7 @@ class WxSchedule( dict ):
 
     self.clear();                                                               # Clear all information from the dictionary
     self.latest = None;                                                         # Set latest attribute to None
+    self._index = None;                                                         # Index must be rebuilt
 
   def updateLatest(self, date):
     if date <= self.date:                                                       # If the start date of the city is less than or equal to today's date
@@ -66,3 +72,115 @@ class WxSchedule( dict ):
        self.latest = date;                                                      # Set the latest attribute to the start date of the info dictionary
      elif date > self.latest:                                                   # Else, if the latest attribute is before the start date in info dictionary
        self.latest = date;                                                      # Set latest to the start date in the info dictionary
+
+  def index(self):
+    """
+    Interval index of all forecast cities
+
+    Cities from all seasons sorted by start date, as parallel lists. The
+    index is built on first use and rebuilt after the schedule changes.
+
+    Returns:
+      tuple : Lists of start dates, end dates, semester:year tags, and
+        identifiers
+
+    """
+
+    if self._index is None:
+      cities = sorted( [ (info['start'], info['end'], semYear, ident,) 
+                         for semYear in self for ident, info in self[semYear].items() ] )
+      self._index = tuple( list(col) for col in zip(*cities) ) if cities else ([], [], [], [])
+    return self._index
+
+  def lookup(self, date, semYear = None):
+    """
+    Determine the forecast city and forecast day for a date
+
+    Arguments:
+      date (date) : The date of interest
+
+    Keyword arguments:
+      semYear (str) : If set, only match cities in this semester:year
+
+    Returns:
+      tuple : Station identifier and forecast day number; both None if
+        no forecast is made on the date
+
+    """
+
+    starts, ends, tags, idents = self.index()
+    i = bisect_right( starts, date ) - 1                                        # Last city starting on or before date
+    if i < 0 or ends[i] < date: return None, None                               # No city on date
+    if semYear is not None and tags[i] != semYear: return None, None
+    day = _forecastDay( (date - starts[i]).days + 1 )
+    if day is None: return None, None
+    return idents[i], day
+
+  def lookup_many(self, dates):
+    """
+    Determine forecast cities and forecast days for many dates
+
+    Vectorized version of lookup.
+
+    Arguments:
+      dates (array-like) : Dates of interest
+
+    Keyword arguments:
+      None.
+
+    Returns:
+      tuple : numpy arrays of station identifiers (None where no forecast
+        is made on the date) and forecast day numbers (0 where no forecast
+        is made)
+
+    """
+
+    starts, ends, tags, idents = self.index()
+    dates  = numpy.asarray( dates, dtype = 'datetime64[D]' )
+    if len(starts) == 0:
+      return numpy.full( dates.shape, None, dtype = object ), numpy.zeros( dates.shape, dtype = int )
+
+    starts = numpy.asarray( starts, dtype = 'datetime64[D]' )
+    ends   = numpy.asarray( ends,   dtype = 'datetime64[D]' )
+    i      = numpy.searchsorted( starts, dates, side = 'right' ) - 1            # Last city starting on or before each date
+    valid  = i >= 0
+    i      = numpy.clip( i, 0, None )
+    valid &= ends[i] >= dates
+
+    day    = (dates - starts[i]).astype( int ) + 1                              # Rough forecast day
+    valid &= (day != 5) & (day != 6)                                            # No forecasting on Saturday/Sunday
+    day    = numpy.where( day >= 7, day % 7 + 4, day )
+    valid &= day < 9
+
+    ids    = numpy.asarray( idents, dtype = object )[i]
+    ids[~valid] = None
+    return ids, numpy.where( valid, day, 0 )
+
+  def forecastDate(self, semYear, ident, day):
+    """
+    Date of forecast day for a forecast city
+
+    Arguments:
+      semYear (str) : semester:year tag
+      ident (str)   : Station identifier
+      day (int)     : Forecast day number (1-8)
+
+    Keyword arguments:
+      None.
+
+    Returns:
+      date : Date of the forecast day; None if city not in schedule
+
+    """
+
+    info = self.get( semYear, {} ).get( ident, None )
+    if info is None: return None
+    return info['start'] + timedelta( days = day_offsets[day-1] )
+
+def _forecastDay( day ):
+  """Convert days since start of forecast city (starting at 1) to forecast day"""
+
+  if day == 5 or day == 6: return None                                          # If day is 5 or 6; no forecasting on Saturday/Sunday
+  if day >= 7: day = (day % 7) + 4                                              # If the day is greater or equal 7, then mod 7 and add 4
+  if day >= 9: return None                                                      # If the day is greater or equal 9, no forecasting on Saturday/Sunday
+  return day
@@ -77,6 +77,56 @@ verifyChckCols = ['city', 'state', 'ident', 'date']
 #  is inserted into the table
 fcstChckCols = [ 'name', 'school', 'category', 'date' ];
 
+# Columns for the SQL table containing the grading state of each forecaster
+#  at each forecast city. Masks have bit (day-1) set for each forecast day
+gradeStateCols = [{'name' : 'name',       'type' : 'TEXT'},
+                  {'name' : 'school',     'type' : 'TEXT'},
+                  {'name' : 'category',   'type' : 'INTEGER'},
+                  {'name' : 'year',       'type' : 'INTEGER'},
+                  {'name' : 'semester',   'type' : 'TEXT'},
+                  {'name' : 'identifier', 'type' : 'TEXT'},
+                  {'name' : 'ndays',      'type' : 'INTEGER'},                  # Number of forecast days
+                  {'name' : 'nmiss',      'type' : 'INTEGER'},                  # Cumulative absences
+                  {'name' : 'first_day',  'type' : 'INTEGER'},                  # First forecast day
+                  {'name' : 'first_date', 'type' : 'DATE'},                     # Date of first forecast day
+                  {'name' : 'day_mask',   'type' : 'INTEGER'},                  # Days with a forecast
+                  {'name' : 'miss_mask',  'type' : 'INTEGER'},                  # Days forecast was missed
+                  {'name' : 'climo_mask', 'type' : 'INTEGER'},                  # Days climatology beat forecast; see WxForecast.Forecasts.calc_grades
+                  {'name' : 'climo_days', 'type' : 'INTEGER'},                  # Number of climatology forecast days for the city
+                  {'name' : 'last_day',   'type' : 'INTEGER'},                  # Latest forecast day
+                  {'name' : 'human',      'type' : 'INTEGER'},                  # Latest forecast has a type; i.e., not guidance or climo
+                  {'name' : 'cum_err',    'type' : 'REAL'},                     # Cumulative error of latest forecast
+                  {'name' : 'norm_city',  'type' : 'REAL'}];                    # Normalized city error of latest forecast
+
+gradeStateChckCols = ['name', 'school', 'category', 'year', 'semester', 'identifier']
+
+# Indices for the SQL tables. Unique indices are on the columns used to check
+#  if an entry already exists, and are the conflict targets when upserting data.
+#  The unique forecasts index also serves lookups by name (e.g., get_forecaster);
+#  the others serve filtering by school/semester/year (get_forecasts), by
+#  forecast city, and verification by date
+sqlIndices = [
+  {'name' : 'forecasts_unique',     'table' : 'forecasts',     'cols' : fcstChckCols,   'unique' : True},
+  {'name' : 'verifications_unique', 'table' : 'verifications', 'cols' : verifyChckCols, 'unique' : True},
+  {'name' : 'schedule_unique',      'table' : 'schedule',      'cols' : [c['name'] for c in scheduleCols], 'unique' : True},
+  {'name' : 'forecasts_school',     'table' : 'forecasts',     'cols' : ['school', 'year', 'semester'],             'unique' : False},
+  {'name' : 'forecasts_city',       'table' : 'forecasts',     'cols' : ['year', 'semester', 'identifier', 'day'],  'unique' : False},
+  {'name' : 'verifications_date',   'table' : 'verifications', 'cols' : ['date', 'ident'],                          'unique' : False},
+  {'name' : 'grade_state_unique',   'table' : 'grade_state',   'cols' : gradeStateChckCols, 'unique' : True},
+  {'name' : 'grade_state_school',   'table' : 'grade_state',   'cols' : ['school', 'year', 'semester'],             'unique' : False},
+  {'name' : 'grade_state_city',     'table' : 'grade_state',   'cols' : ['year', 'semester', 'identifier'],         'unique' : False}
+];
+
+# Settings applied to the SQL database when it is opened. Write-ahead logging
+#  lets readers (e.g., grading) run while data are being written
+sqlPragmas = {
+  'journal_mode' : 'WAL',
+  'synchronous'  : 'NORMAL',
+  'cache_size'   : -65536,                                                      # Negative is size in KiB; i.e., 64 MiB
+  'mmap_size'    : 268435456,                                                   # 256 MiB
+  'temp_store'   : 'MEMORY'
+};
+
 # Column names for some important data in the roster CSV that are used
 # in the WxChall_Grades_Excel class
 fcst_tag  = 'forecaster_id';
@@ -84,8 +134,16 @@ fname_tag = 'first_name';
 lname_tag = 'last_name';
 class_tag = ['class_id_1', 'class_id_2'];
 
+# Columns of the forecasts table used in grading; see WxForecast.Forecasts.calc_grades
+gradeCols = ['abs', 'max', 'min', 'wind', 'precip', 'type', 'err_total', 'cum_err_total', 'norm_city', 'date']
+
 # Column names for the grades dataframe
 grd_df_cols    = ['Forecasts', 'Absence', '# Vaca Forecasts', 'Climo', 'Consen. School', 'Consen. Ntnl', 'Total']
 miss_allowed   = 2
 fcst_per_city  = 8
+day_offsets    = [0, 1, 2, 3, 7, 8, 9, 10]                                      # Days from start of a forecast city to each forecast day; Monday-Thursday for two weeks
 break_bonus    = 0.25
+
+# Number of days after the end of a forecast city after which its results
+# are considered final; i.e., cached results pages no longer expire
+final_days     = 3
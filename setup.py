@@ -59,7 +59,8 @@ setup(
   install_requires     = [ "requests", "bs4", "lxml", "numpy", "scipy", "pandas", "openpyxl", "PyQt5" ],
   scripts              = ['bin/WxChall_Daily_Update',
                           'bin/WxChall_Semester_Update',
-                          'bin/WxChall_Grades'],
+                          'bin/WxChall_Grades',
+                          'bin/WxChall_Batch_Grades'],
   package_data         = {'WxChallenge' : [ sqlFile ]},
   include_package_date = True,
   zip_safe             = False,
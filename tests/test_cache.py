@@ -0,0 +1,74 @@
+import os
+import glob
+import shutil
+import tempfile
+import time
+import unittest
+import warnings
+
+from WxChallenge.WxGrabber import WxGrabber
+
+_page = os.path.join( os.path.dirname(__file__), 'data', 'results_page.html' )
+
+class _Response( object ):
+  """Minimal stand-in for requests.Response"""
+
+  status_code = 200
+  ok          = True
+
+  def __init__(self, content):
+    self.content = content
+
+class TestOfflineCache( unittest.TestCase ):
+  """Offline replay serves cached pages that are past the time-to-live"""
+
+  def setUp(self):
+    self.path = tempfile.mkdtemp()
+    with open( _page, 'rb' ) as fid:
+      self.html = fid.read()
+    self.posts = []
+
+  def tearDown(self):
+    shutil.rmtree( self.path )
+
+  def grabber(self, **kwargs):
+    """Grabber using the temporary cache; requests are recorded, not sent"""
+
+    with warnings.catch_warnings():
+      warnings.simplefilter( 'ignore' )
+      grab = WxGrabber( cache = self.path, cache_ttl = 60.0, **kwargs )
+    def post(url, **kwargs):
+      self.posts.append( url )
+      return _Response( self.html )
+    grab._session.post = post
+    return grab
+
+  def expire(self):
+    """Make all cached pages older than the time-to-live"""
+
+    old = time.time() - 86400.0
+    for path in glob.glob( os.path.join( self.path, '*', '*.html.gz' ) ):
+      os.utime( path, (old, old) )
+
+  def test_offline_expired(self):
+    ref = self.grabber().getResults( 'fall', 2020, 'KOUN', 'ou', 1 )            # Not final; base class knows no schedule
+    self.assertEqual( len(self.posts), 1 )
+    self.expire()
+
+    res = self.grabber( offline = True ).getResults( 'fall', 2020, 'KOUN', 'ou', 1 )
+    self.assertIsNotNone( res )
+    self.assertEqual( len(self.posts), 1 )                                      # Nothing downloaded while offline
+    self.assertEqual( res.results( columnar = True ), ref.results( columnar = True ) )
+
+  def test_online_expired(self):
+    self.grabber().getResults( 'fall', 2020, 'KOUN', 'ou', 1 )
+    self.expire()
+    self.grabber().getResults( 'fall', 2020, 'KOUN', 'ou', 1 )                  # Online, expired page is downloaded again
+    self.assertEqual( len(self.posts), 2 )
+
+  def test_offline_missing(self):
+    self.assertIsNone( self.grabber( offline = True ).getResults( 'fall', 2020, 'KOUN', 'ou', 1 ) )
+    self.assertEqual( len(self.posts), 0 )
+
+if __name__ == "__main__":
+  unittest.main()
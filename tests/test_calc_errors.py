@@ -0,0 +1,34 @@
+import itertools
+import unittest
+
+import numpy as np
+
+from WxChallenge.WxForecast import calc_error, calc_errors
+
+class TestCalcErrors( unittest.TestCase ):
+  """Vectorized calc_errors gives exactly the same errors as calc_error"""
+
+  def setUp(self):
+    temps  = [48, 49.5, 50, 50.5, 51.4, 63]                                     # Includes half degrees to check rounding
+    winds  = [0, 7.5, 12, 13]
+    precip = [0.0, 0.001, 0.0049, 0.005, 0.0051, 0.01, 0.05, 0.09, 0.099, 0.1, 0.101,
+              0.15, 0.24, 0.249, 0.25, 0.251, 0.33, 0.49, 0.5, 0.51, 0.75, 1.0, 1.37, 2.5]
+    fcst   = list( itertools.product( temps, temps[::2], winds, precip ) )
+    obs    = list( itertools.product( [50, 63], [48], [12], precip ) )
+    pairs  = list( itertools.product( fcst, obs ) )
+    self.fcst   = np.array( [p[0] for p in pairs], dtype = float )
+    self.verify = np.array( [p[1] for p in pairs], dtype = float )
+
+  def test_grid(self):
+    ref = np.array( [calc_error( f, v ) for f, v in zip(self.fcst, self.verify)] )
+    err = calc_errors( self.fcst, self.verify )
+    self.assertEqual( err.shape, ref.shape )
+    self.assertTrue( np.array_equal( err, ref ) )
+
+  def test_broadcast(self):
+    ref = np.array( [calc_error( f, self.verify[0] ) for f in self.fcst[:50]] )
+    self.assertTrue( np.array_equal( calc_errors( self.fcst[:50], self.verify[0] ), ref ) )
+    self.assertEqual( calc_errors( self.fcst[0], self.verify[0] ), calc_error( self.fcst[0], self.verify[0] ) )
+
+if __name__ == "__main__":
+  unittest.main()
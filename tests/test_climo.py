@@ -0,0 +1,99 @@
+import random
+import unittest
+from datetime import date, timedelta
+
+import numpy as np
+
+from WxChallenge.WxForecast import Forecasts, climo_penalize, required
+from WxChallenge.data import day_offsets
+
+_cols = ['school', 'year', 'semester', 'identifier', 'day', 'category', 'name', 'abs', 'max', 'min', 'wind',
+         'precip', 'type', 'err_total', 'cum_err_total', 'norm_city', 'date']
+_indx = ['school', 'year', 'semester', 'identifier', 'day', 'category', 'name']
+
+def _climo_penalty( abs, fcstErr, climoErr, climoNorm ):
+  """Climatology deduction for one forecaster; positional rule in Forecasts.calc_grades before the join"""
+
+  if len(climoErr) != len(fcstErr): return 0.0                                  # Day counts differ; no penalty
+  miss  = np.insert( (abs[1:] - abs[0:-1]), 0, abs[0] )
+  climo = (miss == False) & (climoErr < fcstErr) & (climoNorm / 10.0 > 3.0)
+  return -climo_penalize * np.clip( sum(climo), 0, required )
+
+class TestClimo( unittest.TestCase ):
+  """Climatology joined on city and day gives the same penalty as the positional rule"""
+
+  def setUp(self):
+    self.rng    = random.Random( 0 )
+    self.cities = {'KAAA' : date(2020, 9, 28), 'KBBB' : date(2020, 10, 12)}
+    self.climo  = {}                                                            # Error and normalized error of climatology by city and day
+    for ident in self.cities:
+      for day in range(1, 9):
+        self.climo[ident, day] = (self.rng.random() * 10, self.rng.uniform(-20, 60),)
+
+  def row(self, school, ident, day, name, abs, err, norm = 0.0):
+    dt = self.cities[ident] + timedelta(days = day_offsets[day-1])
+    return [school, 2020, 'fall', ident, day, 1, name, abs, 70, 50, 10, 0.1, 'H', err, 0.0, norm, dt]
+
+  def forecasts(self, ndays = None):
+    """Forecasters at each city; ndays limits the days of some forecasters"""
+
+    rows, ref = [], {}
+    for school in ('ou', 'tamu'):
+      for ident in self.cities:
+        for f in range(8):
+          name = 'f{}'.format(f)
+          days = ndays if (ndays and f % 2) else 8
+          abs  = np.cumsum( [self.rng.random() < 0.2 for d in range(days)] )
+          err  = np.array( [self.rng.random() * 12 for d in range(days)] )
+          rows.extend( [self.row( school, ident, d+1, name, abs[d], err[d] ) for d in range(days)] )
+          ref[school, ident, name] = (abs, err,)
+    return Forecasts( rows, columns = _cols, index = _indx ), ref
+
+  def models(self, days = range(1, 9)):
+    """CLIMO_ and another model for each city, in reverse order so position does not match day"""
+
+    rows = []
+    for ident in self.cities:
+      for day in reversed( days ):
+        err, norm = self.climo[ident, day]
+        rows.append( self.row( 'xxx', ident, day, 'CLIMO_', 0, err, norm ) )
+        rows.append( self.row( 'xxx', ident, day, 'GFS_MOS', 0, 1.0 ) )
+    return Forecasts( rows, columns = _cols, index = _indx )
+
+  def verify(self):
+    """Verification for every forecast day, keyed by date as from WxSQLite.get_verification"""
+
+    out = {}
+    for ident, start in self.cities.items():
+      for offset in day_offsets:
+        dt      = start + timedelta(days = offset)
+        out[dt] = ('city', 'st', ident, dt, 70, 50, 10, 0.1)
+    return out
+
+  def penalties(self, fcst):
+    grades = fcst.grades.reset_index()
+    return {(r.school, r.identifier, r.name) : r.Climo for r in grades.itertuples()}
+
+  def test_full(self):
+    fcst, ref = self.forecasts()
+    fcst.calc_grades( self.models(), verify = self.verify() )
+    out = self.penalties( fcst )
+    for key, (abs, err) in ref.items():
+      climo = np.array( [self.climo[key[1], d+1] for d in range(len(err))] )
+      self.assertEqual( out[key], _climo_penalty( abs, err, climo[:,0], climo[:,1] ), key )
+    self.assertTrue( any( [val != 0 for val in out.values()] ) )
+
+  def test_missing(self):
+    fcst, ref = self.forecasts( ndays = 5 )
+    with self.assertLogs( 'WxChallenge.WxForecast', 'WARNING' ) as logs:
+      fcst.calc_grades( self.models( days = range(1, 7) ), verify = self.verify() )  # No climatology for days 7 and 8
+    self.assertTrue( any( ['day(s) [7, 8]' in msg for msg in logs.output] ) )
+    out = self.penalties( fcst )
+    for key, (abs, err) in ref.items():
+      ndays = min( len(err), 6 )                                                # Changed: days with climatology are compared, whatever the day counts
+      climo = np.array( [self.climo[key[1], d+1] for d in range(ndays)] )
+      self.assertEqual( out[key], _climo_penalty( abs[:ndays], err[:ndays], climo[:,0], climo[:,1] ), key )
+    self.assertTrue( any( [out[key] != 0 for key, (abs, err) in ref.items() if len(err) != 6] ) )  # Positional rule gave these no penalty
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,96 @@
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import unittest
+import warnings
+from datetime import date, timedelta
+
+from WxChallenge.WxSQLite import WxSQLite
+from WxChallenge import data as WxData
+
+_fcstVars   = [c['name'] for c in WxData.forecastCols]
+_verifyVars = [c['name'] for c in WxData.verifyCols]
+
+def _latest( rows, vars, chck ):
+  """Rows left by writing each row in turn with the check-then-update of add_forecasts before the unique index"""
+
+  index = [vars.index(v) for v in chck]
+  out   = {}
+  for row in rows:
+    out[ tuple( row[i] for i in index ) ] = tuple( row )
+  return sorted( out.values() )
+
+class TestIndices( unittest.TestCase ):
+  """Opening a database that predates the unique indices removes duplicates, keeping the latest"""
+
+  def setUp(self):
+    self.path = tempfile.mkdtemp()
+    self.file = os.path.join( self.path, 'test.sql' )
+    rng       = random.Random( 0 )
+    start     = date(2020, 9, 28)
+    self.fcst, self.verify = [], []
+    for i in range(300):                                                        # Many repeats of few keys
+      row = dict( (v, 0) for v in _fcstVars )
+      row.update( name = 'f{}'.format( rng.randint(0, 4) ), school = rng.choice( ['ou', 'psu'] ), category = 1,
+                  date = start + timedelta(days = rng.randint(0, 3)), identifier = 'KAAA', semester = 'fall',
+                  year = 2020, max = rng.randint(50, 90), err_total = rng.random(), type = 'H' )
+      row['day'] = (row['date'] - start).days + 1
+      self.fcst.append( [row[v] for v in _fcstVars] )
+      dt = start + timedelta(days = rng.randint(0, 7))
+      self.verify.append( ['city', 'st', 'KAAA', dt, rng.randint(50, 90), 40, 10, 0.1] )
+
+  def tearDown(self):
+    shutil.rmtree( self.path )
+
+  def open(self):
+    with warnings.catch_warnings():
+      warnings.simplefilter( 'ignore' )
+      return WxSQLite( file = self.file )
+
+  def legacy(self):
+    """Database as written before the unique indices, with duplicate entries"""
+
+    self.open().close()
+    db = sqlite3.connect( self.file, detect_types = sqlite3.PARSE_DECLTYPES )
+    db.execute( 'DROP INDEX forecasts_unique' )
+    db.execute( 'DROP INDEX verifications_unique' )
+    db.executemany( 'INSERT INTO forecasts ({}) VALUES ({})'.format(
+      ','.join(_fcstVars), ','.join( ['?'] * len(_fcstVars) ) ), self.fcst )
+    db.executemany( 'INSERT INTO verifications VALUES ({})'.format( ','.join( ['?'] * len(_verifyVars) ) ), self.verify )
+    db.commit()
+    db.close()
+
+  def rows(self, wx, table, vars):
+    wx.cursor.execute( 'SELECT {} FROM {}'.format( ','.join(vars), table ) )
+    return sorted( wx.cursor.fetchall() )
+
+  def test_dedup(self):
+    self.legacy()
+    with self.assertLogs( 'WxChallenge.WxSQLite', 'WARNING' ) as logs:
+      wx = self.open()
+    self.assertEqual( len(logs.output), 2 )                                     # One for each table with duplicates
+    try:
+      self.assertEqual( self.rows( wx, 'forecasts', _fcstVars ),
+                        _latest( self.fcst, _fcstVars, WxData.fcstChckCols ) )
+      self.assertEqual( self.rows( wx, 'verifications', _verifyVars ),
+                        _latest( self.verify, _verifyVars, WxData.verifyChckCols ) )
+      wx.cursor.execute( 'PRAGMA index_list(forecasts)' )
+      self.assertIn( 'forecasts_unique', [idx[1] for idx in wx.cursor.fetchall()] )
+    finally:
+      wx.close()
+
+  def test_upsert(self):
+    wx = self.open()
+    try:
+      wx.add_forecasts( self.fcst )                                             # Same result as writing one at a time
+      self.assertEqual( self.rows( wx, 'forecasts', _fcstVars ),
+                        _latest( self.fcst, _fcstVars, WxData.fcstChckCols ) )
+    finally:
+      wx.close()
+    with self.assertNoLogs( 'WxChallenge.WxSQLite', 'WARNING' ):                # Nothing to remove
+      self.open().close()
+
+if __name__ == "__main__":
+  unittest.main()
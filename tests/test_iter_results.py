@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import warnings
+import weakref
+
+from WxChallenge.WxChallenge import WxChallenge
+
+class _Results( object ):
+  """Stand-in for a parsed results page"""
+
+  def __init__(self, arg):
+    self.arg = arg
+
+class TestIterResults( unittest.TestCase ):
+  """Concurrent results pipeline yields the same pages as the serial path without holding them all"""
+
+  def setUp(self):
+    self.path = tempfile.mkdtemp()
+    with warnings.catch_warnings():
+      warnings.simplefilter( 'ignore' )
+      self.wx = WxChallenge( file = os.path.join( self.path, 'test.sql' ) )
+    self.args   = [('fall', 2020, 'KOUN', 'ou', day) for day in range(1, 41)]
+    self.alive  = weakref.WeakSet()                                             # Results not yet freed
+    self.lock   = threading.Lock()
+    self.wx._fetchResults = self.fetch
+
+  def tearDown(self):
+    self.wx.close()
+    shutil.rmtree( self.path )
+
+  def fetch(self, arg, school = None):
+    time.sleep( 0.001 )
+    res = _Results( arg )
+    with self.lock:
+      self.alive.add( res )
+    return res, [arg]
+
+  def consume(self, workers):
+    """Run the pipeline; return arguments yielded and peak number of live results"""
+
+    out, peak = [], 0
+    for arg, res, forecasts in self.wx._WxChallenge__iter_results( self.args, workers = workers ):
+      self.assertIs( res.arg, arg )
+      self.assertEqual( forecasts, [arg] )
+      out.append( arg )
+      del res
+      with self.lock:
+        peak = max( peak, len(self.alive) )
+    return out, peak
+
+  def test_serial(self):
+    out, peak = self.consume( None )
+    self.assertEqual( out, self.args )
+    self.assertLessEqual( peak, 1 )
+
+  def test_workers(self):
+    workers   = 4
+    out, peak = self.consume( workers )
+    self.assertEqual( sorted(out), self.args )                                  # Same pages as serial, in completion order
+    self.assertLessEqual( peak, 2 * workers + 1 )                               # Bounded by window, not by number of pages
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,48 @@
+import os
+import unittest
+
+from bs4 import BeautifulSoup
+
+from WxChallenge.WxGrabber import WxResults, WxResultsLXML
+
+_page = os.path.join( os.path.dirname(__file__), 'data', 'results_page.html' )
+
+def _columns( forecasts ):
+  """Transpose list of ForecastRow to dictionary of column arrays"""
+
+  forecasts = sorted( forecasts, key = lambda fc: (fc.name, fc.school, fc.category) )
+  return {col : [getattr(fc, col) for fc in forecasts] for col in forecasts[0]._fields}
+
+class TestResultsParser( unittest.TestCase ):
+  """Parity of the lxml-based results parser with the BeautifulSoup parser"""
+
+  @classmethod
+  def setUpClass(cls):
+    with open( _page, 'rb' ) as fid:
+      html = fid.read()
+    cls.bs4  = WxResults( BeautifulSoup(html, 'lxml'), 'KOUN' )
+    cls.lxml = WxResultsLXML( html, 'KOUN' )
+
+  def test_page_info(self):
+    for attr in ['max', 'min', 'wind', 'precip', 'year', 'school', 'day', 'date', 'city', 'state']:
+      self.assertEqual( getattr(self.bs4, attr), getattr(self.lxml, attr), attr )
+
+  def test_columns(self):
+    bs4  = _columns( self.bs4.results(  columnar = True ) )
+    lxml = _columns( self.lxml.results( columnar = True ) )
+    self.assertEqual( len(bs4['name']), 12 )                                    # Forecasters plus models
+    self.assertEqual( list(bs4.keys()), list(lxml.keys()) )
+    for col in bs4:
+      self.assertEqual( bs4[col], lxml[col], col )
+
+  def test_school(self):
+    bs4  = _columns( self.bs4.results(  school = ['ou', 'psu'], columnar = True ) )
+    lxml = _columns( self.lxml.results( school = ['ou', 'psu'], columnar = True ) )
+    self.assertEqual( bs4, lxml )
+    self.assertEqual( set(lxml['school']), {'ou', 'psu', 'xxx'} )
+
+  def test_dict(self):
+    self.assertEqual( self.bs4.results(), self.lxml.results() )
+
+if __name__ == "__main__":
+  unittest.main()
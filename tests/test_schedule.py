@@ -0,0 +1,88 @@
+import unittest
+from datetime import date, timedelta
+
+import numpy as np
+
+from WxChallenge.WxSchedule import WxSchedule
+
+def _getIdentDay( schedule, semYear, date ):
+  """Linear scan of the schedule; WxChallenge.getIdentDay before the interval index"""
+
+  out_id, out_day = None, None
+  if semYear in schedule:
+    for identifier in schedule[semYear]:
+      tmp = schedule[semYear][identifier]
+      if tmp['start'] <= date and tmp['end'] >= date:
+        day = (date - tmp['start']).days + 1
+        if day == 5 or day == 6: break
+        if day >= 7: day = (day % 7) + 4
+        if day >= 9: break
+        out_id, out_day = identifier, day
+        break
+  return out_id, out_day
+
+def _forecastDate( start, day ):
+  """Offset of forecast day from start of city; WxChallenge.__get_results_args_dates before the interval index"""
+
+  offset  = 7 if day > 4 else 0
+  offset += (day-1) % 4
+  return start + timedelta(days = offset)
+
+class TestSchedule( unittest.TestCase ):
+  """Interval index lookups give the same cities and days as the linear scan"""
+
+  def setUp(self):
+    self.schedule = WxSchedule()
+    self.schedule.date = date(2022, 1, 1)
+    season = {}
+    for semYear, first in (('fall:2020', date(2020, 9, 14)), ('spring:2021', date(2021, 1, 18))):
+      season[semYear] = {}
+      for i in range(7):
+        start = first + timedelta(days = 14*i)                                  # Cities start on Mondays, two weeks apart
+        ident = 'K{}{:02d}'.format(semYear[0].upper(), i)
+        season[semYear][ident] = {'ident' : ident, 'start' : start, 'end' : start + timedelta(days = 11)}
+    self.schedule.Update( season )
+    self.dates = [date(2020, 9, 1) + timedelta(days = i) for i in range(280)]   # Before, during, between, and after semesters
+
+  def test_lookup(self):
+    found = 0
+    for day in self.dates:
+      semYear = 'fall:2020' if day.year == 2020 else 'spring:2021'
+      ref     = _getIdentDay( self.schedule, semYear, day )
+      self.assertEqual( self.schedule.lookup( day, semYear = semYear ), ref, day )
+      self.assertEqual( self.schedule.lookup( day ), ref, day )
+      self.assertEqual( self.schedule.lookup( day, semYear = 'fall:1999' ), (None, None) )
+      found += ref[0] is not None
+    self.assertEqual( found, 14 * 9 )                                           # Every forecast day of every city, and day 7 which the scan also maps to day 4
+
+  def test_lookup_many(self):
+    ids, days = self.schedule.lookup_many( np.array( self.dates, dtype = 'datetime64[D]' ) )
+    for day, ident, num in zip( self.dates, ids, days ):
+      ref = self.schedule.lookup( day )
+      self.assertEqual( (ident, num), (ref[0], ref[1] or 0), day )
+
+  def test_lookup_empty(self):
+    ids, days = WxSchedule().lookup_many( self.dates[:3] )
+    self.assertEqual( list(ids), [None] * 3 )
+    self.assertEqual( list(days), [0] * 3 )
+    self.assertEqual( WxSchedule().lookup( self.dates[0] ), (None, None) )
+
+  def test_forecastDate(self):
+    for semYear in self.schedule:
+      for ident, info in self.schedule[semYear].items():
+        for day in range(1, 9):
+          date = self.schedule.forecastDate( semYear, ident, day )
+          self.assertEqual( date, _forecastDate( info['start'], day ) )
+          self.assertEqual( self.schedule.lookup( date ), (ident, day) )
+    self.assertIsNone( self.schedule.forecastDate( 'fall:2020', 'KXXX', 1 ) )
+
+  def test_update(self):
+    self.schedule.lookup( self.dates[0] )                                       # Build the index
+    start = date(2021, 6, 7)
+    self.schedule.Update( {'spring:2021' : {'KNEW' : {'ident' : 'KNEW', 'start' : start, 'end' : start + timedelta(days = 11)}}} )
+    self.assertEqual( self.schedule.lookup( start + timedelta(days = 8) ), ('KNEW', 6) )
+    self.schedule.Clear()
+    self.assertEqual( self.schedule.lookup( start ), (None, None) )
+
+if __name__ == "__main__":
+  unittest.main()
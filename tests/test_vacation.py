@@ -0,0 +1,100 @@
+import random
+import unittest
+from datetime import date, timedelta
+
+import numpy as np
+
+from WxChallenge.WxForecast import vacation_mask, grade_segments
+
+def _vacation_counts( absent, dates, vacation ):
+  """Missed and vacation forecasts for one forecaster; loop in Forecasts.calc_grades before the interval table"""
+
+  miss  = np.insert( (absent[1:] - absent[0:-1]), 0, absent[0] )
+  nmiss = absent.max()
+  vacaN = 0
+  for vaca in vacation:
+    vacaID = (dates >= vaca[0]) & (dates <= vaca[1])
+    vacaN  = sum( vacaID )
+    if vacaN > 0:
+      nmiss -= vacaN
+      vacaN -= sum( miss[vacaID] )
+  return nmiss, vacaN
+
+class TestVacation( unittest.TestCase ):
+  """Vacation interval table gives the same flags and counts as the loop over vacations"""
+
+  def setUp(self):
+    rng        = random.Random( 0 )
+    first      = date(2020, 9, 14)
+    self.rng   = rng
+    self.dates = np.array( [first + timedelta(days = i) for i in range(120)] )
+    self.fcsts = []                                                             # Dates and cumulative absences of each forecaster
+    for i in range(200):
+      start  = first + timedelta(days = 14 * rng.randint(0, 7))
+      ndays  = rng.randint(1, 8)
+      dates  = np.array( [start + timedelta(days = d) for d in (0, 1, 2, 3, 7, 8, 9, 10)[:ndays]] )
+      absent = np.cumsum( [rng.random() < 0.3 for d in range(ndays)] )
+      self.fcsts.append( (dates, absent,) )
+
+  def vacations(self, n):
+    """Random vacations; may overlap, touch, be single days, and are not sorted"""
+
+    vacation = []
+    for i in range(n):
+      start = self.dates[ self.rng.randint(0, len(self.dates)-1) ]
+      vacation.append( (start, start + timedelta(days = self.rng.randint(0, 9)),) )
+    return vacation
+
+  def grade(self, vacation):
+    """Number of forecasts and vacation forecasts from grade_segments"""
+
+    dates  = np.concatenate( [fc[0] for fc in self.fcsts] )
+    absent = np.concatenate( [fc[1] for fc in self.fcsts] )
+    starts = np.cumsum( [0] + [len(fc[0]) for fc in self.fcsts[:-1]] )
+    zeros  = np.zeros( len(dates) )
+    ones   = np.ones( len(starts) )
+    out    = grade_segments( starts, absent, vacation_mask( dates, vacation ),
+                             zeros, zeros, zeros, ones, ones )
+    return out[0], out[2]
+
+  def test_mask(self):
+    for n in range(6):
+      for trial in range(20):
+        vacation = self.vacations( n )
+        ref      = np.zeros( len(self.dates), dtype = bool )
+        for vaca in vacation:
+          ref |= (self.dates >= vaca[0]) & (self.dates <= vaca[1])
+        self.assertTrue( np.array_equal( vacation_mask( self.dates, vacation ), ref ), vacation )
+    self.assertFalse( vacation_mask( self.dates, None ).any() )
+    self.assertEqual( vacation_mask( self.dates, [] ).shape, self.dates.shape )
+
+  def test_single(self):
+    for trial in range(20):
+      vacation      = self.vacations( 1 )
+      nFcsts, vacaN = self.grade( vacation )
+      ref           = [_vacation_counts( fc[1], fc[0], vacation ) for fc in self.fcsts]
+      self.assertEqual( list(nFcsts), [len(fc[0]) - r[0] for fc, r in zip(self.fcsts, ref)] )
+      self.assertEqual( list(vacaN),  [r[1] for r in ref] )
+
+  def test_disjoint(self):
+    vacation      = [(date(2020, 10, 20), date(2020, 10, 24)), (date(2020, 9, 15), date(2020, 9, 16)),
+                     (date(2020, 11, 26), date(2020, 11, 27))]
+    nFcsts, vacaN = self.grade( vacation )
+    ref           = [_vacation_counts( fc[1], fc[0], vacation ) for fc in self.fcsts]
+    self.assertEqual( list(nFcsts), [len(fc[0]) - r[0] for fc, r in zip(self.fcsts, ref)] )
+    each          = [[_vacation_counts( fc[1], fc[0], [vaca] )[1] for vaca in vacation] for fc in self.fcsts]
+    self.assertEqual( list(vacaN), [sum(e) for e in each] )                     # Changed: total over all vacations, not the last one only
+    self.assertNotEqual( list(vacaN), [e[-1] for e in each] )                   # Data exercises the change
+
+  def test_overlap(self):
+    vacation      = [(date(2020, 10, 20), date(2020, 10, 26)), (date(2020, 10, 25), date(2020, 10, 29))]
+    merged        = [(date(2020, 10, 20), date(2020, 10, 29))]
+    self.assertEqual( [list(out) for out in self.grade( vacation )],            # Changed: days in both vacations are counted once
+                      [list(out) for out in self.grade( merged )] )
+    ref           = [_vacation_counts( fc[1], fc[0], merged ) for fc in self.fcsts]
+    nFcsts, vacaN = self.grade( vacation )
+    self.assertEqual( list(nFcsts), [len(fc[0]) - r[0] for fc, r in zip(self.fcsts, ref)] )
+    self.assertEqual( list(vacaN),  [r[1] for r in ref] )
+
+if __name__ == "__main__":
+  unittest.main()